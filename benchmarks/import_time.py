@@ -0,0 +1,67 @@
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+"""
+Import-time benchmark of lostma_db: the import must stay cheap for short CLI and cron jobs
+    python benchmarks/import_time.py [--budget 0.1] [--runs 10]
+The package and the entry point of the jobs which only parse the validation log (analyse.log_data) are probed
+It exits with an error when a best time is over budget, or when duckdb/pandas are loaded at import
+"""
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+HEAVY_MODULES = ["duckdb", "pandas", "pyarrow", "polars"]
+# name of the probe -> import statement
+IMPORTS = {
+    "lostma_db": "import lostma_db",
+    "lostma_db.analyse.log_data": "from lostma_db.analyse import log_data",
+}
+PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "{statement}\n"
+    "elapsed = time.perf_counter() - start\n"
+    f"print(elapsed, *[m for m in {HEAVY_MODULES!r} if m in sys.modules])\n"
+)
+
+
+def measure(statement: str, runs: int) -> tuple[list[float], set[str]]:
+    """Run an import in fresh interpreters, return the times and the heavy modules loaded"""
+    times, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(statement=statement)],
+            check=True,
+            capture_output=True,
+            text=True,
+            env={**os.environ, "PYTHONPATH": str(SRC)},
+        ).stdout.split()
+        times.append(float(out[0]))
+        loaded.update(out[1:])
+    return times, loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import-time benchmark of lostma_db")
+    parser.add_argument("--budget", type=float, default=0.1, help="max import time, in seconds")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    failed = False
+    for (name, statement) in IMPORTS.items():
+        times, loaded = measure(statement, args.runs)
+        best = min(times)
+        print(f"import {name}: best {best * 1000:.1f} ms, "
+              f"median {sorted(times)[len(times) // 2] * 1000:.1f} ms over {args.runs} runs")
+        if loaded:
+            print(f"FAIL: loaded at import: {', '.join(sorted(loaded))}")
+            failed = True
+        if best > args.budget:
+            print(f"FAIL: over the budget of {args.budget * 1000:.0f} ms")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
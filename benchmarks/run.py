@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import synthetic
+from lostma_db import LostmaDB, interval
+from lostma_db import analyse as reports
+
+"""
+Benchmarks of the public entry points of lostma_db on synthetic dbs, offline
+    python benchmarks/run.py [--scales 1 5] [--repeat 3] [--only analyse]
+Each run is appended to benchmarks/history.jsonl (one line per benchmark and scale),
+and compared with the former run of the same benchmark at the same scale
+The same benchmarks run under pytest-benchmark in tests/test_benchmarks.py
+The functions building them do not touch the db: it is only read when a benchmark runs
+"""
+
+HISTORY = Path(__file__).resolve().parent / "history.jsonl"
+LANGUAGE = "fro (Old French)"
+
+
+def db_benchmarks(db: LostmaDB) -> dict:
+    """Entry points of LostmaDB: the cache of results is disabled, each call does the whole work"""
+    return {
+        "build_scope_index": db.build_scope_index,
+        "build_date_index": db.build_date_index,
+        "texts": lambda: db.texts(LANGUAGE),
+        "witnesses": db.witnesses,
+        "witnesses arrow": lambda: db.witnesses(result_format="arrow"),
+        "iter_witnesses": lambda: sum(batch.num_rows for batch in db.iter_witnesses(batch_size=10_000)),
+        "tradition": lambda: db.tradition(LANGUAGE),
+        "build_tradition_closure": db.build_tradition_closure,
+        "analyse witness": lambda: db.analyse("witness", LANGUAGE),
+        "analyse story": lambda: db.analyse("story"),
+        "analyse_all": db.analyse_all,
+        "dated": lambda: db.dated("Witness", "date_of_creation", 1225, 1265),
+        "interval": lambda: interval(db.table("Witness"), "date_of_creation", 1225, 1265),
+        "run_many": lambda: db.run_many([f"SELECT count(*) FROM {table}"
+                                         for table in ["TextTable", "Witness", "Part", "DocumentTable"]]),
+    }
+
+
+def graph_benchmarks(db: LostmaDB) -> dict:
+    """The tradition graph: built again by tradition_graph, then walked in memory"""
+    def build():
+        db._graph = None
+        return db.tradition_graph()
+
+    # the graph is only built when a benchmark runs (tradition_graph keeps it until the db changes)
+    return {
+        "tradition_graph": build,
+        "graph corpus documents": lambda: db.tradition_graph().corpus("document", LANGUAGE),
+        "graph degrees": lambda: db.tradition_graph().degree_distribution("document", "part"),
+        "graph components": lambda: db.tradition_graph().components(),
+    }
+
+
+def corpus_benchmarks(db: LostmaDB) -> dict:
+    """The same requests on a language, once the corpus tables are sliced by language"""
+    return {
+        "build_corpus_tables": db.build_corpus_tables,
+        "texts (slices)": lambda: db.texts(LANGUAGE),
+        "witnesses (slices)": lambda: db.witnesses(LANGUAGE),
+        "tradition (slices)": lambda: db.tradition(LANGUAGE),
+        "analyse witness (slices)": lambda: db.analyse("witness", LANGUAGE),
+        "analyse_all (slices)": db.analyse_all,
+    }
+
+
+def parquet_benchmarks(db: LostmaDB, directory: Path) -> dict:
+    """The export of the db in Parquet files, and the requests on a language in read mode"""
+    parquet = LostmaDB(None, None, parquet_dir=directory, cache_bytes=0)
+    parquet.schema_dir = db.schema_dir
+    return {
+        "export_parquet": lambda: db.export_parquet(directory),
+        "texts (parquet)": lambda: parquet.texts(LANGUAGE),
+        "witnesses (parquet)": lambda: parquet.witnesses(LANGUAGE),
+        "analyse witness (parquet)": lambda: parquet.analyse("witness", LANGUAGE),
+        "analyse_all (parquet)": parquet.analyse_all,
+    }
+
+
+def report_benchmarks() -> dict:
+    """Reports of analyse.py, which open the db file themselves"""
+    return {
+        "log_data": reports.log_data,
+        "count_log": lambda: reports.count_log(refresh=True),
+        "count_required_data": reports.count_required_data,
+        "collect_presence_data": reports.collect_presence_data,
+        "validation_enum": reports.validation_enum,
+    }
+
+
+def measure(function, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_scale(scale: float, repeat: int, only: str = None) -> list[dict]:
+    results = []
+
+    def run(benchmarks: dict) -> None:
+        for (name, function) in benchmarks.items():
+            if only and only not in name:
+                continue
+            times = measure(function, repeat)
+            results.append({"benchmark": name, "scale": scale, "best": min(times),
+                            "median": statistics.median(times), "repeat": repeat})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path, schema_dir, log_path = synthetic.build(tmp, scale)
+        db = LostmaDB(None, None, duckdb_path=db_path, cache_bytes=0)
+        db.schema_dir = schema_dir
+        db.build_scope_index()
+        db.build_date_index()
+        run(db_benchmarks(db))
+        run(graph_benchmarks(db))
+        db.build_corpus_tables()
+        run(corpus_benchmarks(db))
+        run(parquet_benchmarks(db, db.export_parquet(Path(tmp) / "parquet")))
+        # the reports connect to the db file themselves, with another configuration
+        db._close_connection()
+        reports.VALIDATION_LOG, reports.duck_db_path, reports.schema_path = log_path, db_path, schema_dir
+        run(report_benchmarks())
+    return results
+
+
+def environment() -> dict:
+    import duckdb
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"date": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "duckdb": duckdb.__version__,
+            "machine": f"{platform.machine()} x{os.cpu_count()}"}
+
+
+def last_runs(history: Path) -> dict:
+    """Best time of the former run of each (benchmark, scale)"""
+    last = {}
+    if history.is_file():
+        with open(history) as f:
+            for line in f:
+                record = json.loads(line)
+                last[(record["benchmark"], record["scale"])] = record["best"]
+    return last
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of lostma_db on synthetic dbs")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 5])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", help="run the benchmarks whose name contains this text")
+    parser.add_argument("--history", type=Path, default=HISTORY)
+    parser.add_argument("--no-history", action="store_true", help="do not append this run to the history")
+    args = parser.parse_args()
+    last = last_runs(args.history)
+    env = environment()
+    results = []
+    for scale in args.scales:
+        results += run_scale(scale, args.repeat, args.only)
+    print(f"{'benchmark':<28}{'scale':>7}{'best (s)':>11}{'median (s)':>12}{'vs last':>9}")
+    for result in results:
+        former = last.get((result["benchmark"], result["scale"]))
+        change = f"x{result['best'] / former:.2f}" if former else ""
+        print(f"{result['benchmark']:<28}{result['scale']:>7g}{result['best']:>11.4f}"
+              f"{result['median']:>12.4f}{change:>9}")
+    if not args.no_history:
+        with open(args.history, "a") as f:
+            for result in results:
+                f.write(json.dumps({**env, **result}) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+import argparse
+import csv
+import random
+from pathlib import Path
+
+"""
+Generator of a synthetic LostMa db, for the benchmarks: no download, no Heurist account
+    python benchmarks/synthetic.py DIRECTORY [--scale 1]
+The tables, their columns and the schema CSV files follow what the Heurist-API CLI exports:
+LIST foreign keys ("... H-ID"), date structs (value, estMinDate, estMaxDate), review_status,
+a header row in each schema file and the vocabularies of the enum fields
+At scale 1: 1,000 texts, 3,000 witnesses, 2,000 parts, 1,000 documents...
+"""
+
+LANGUAGES = ["dum (Middle Dutch)", "enm (Middle English)", "fro (Old French)", "frm (Middle French)",
+             "lat (Latin)", "oci (Old Occitan)"]
+RECORD_TYPES = [(101, "text"), (102, "witness"), (103, "part"), (104, "document"), (105, "digitization"),
+                (106, "physDesc"), (107, "stemma"), (108, "scripta"), (109, "story"), (110, "genre")]
+REVIEW_STATUS = ["Action required", "Done"]
+
+# Heurist date: an exact value, or an estimated interval, or nothing
+DATE_STRUCT = (
+    "CASE WHEN random() < 0.2 THEN NULL "
+    "WHEN random() < 0.5 THEN {{'value': make_timestamp({year}, 1, 1, 0, 0, 0), "
+    "'estMinDate': NULL::TIMESTAMP, 'estMaxDate': NULL::TIMESTAMP}} "
+    "ELSE {{'value': NULL::TIMESTAMP, 'estMinDate': make_timestamp({year}, 1, 1, 0, 0, 0), "
+    "'estMaxDate': make_timestamp({year} + 50, 1, 1, 0, 0, 0)}} END"
+)
+
+
+def sizes(scale: float, parts: int = None) -> dict:
+    # parts: number of parts, in place of 2 for each text (ex: as many parts as witnesses)
+    n = max(int(1000 * scale), 10)
+    return {"TextTable": n, "Witness": 3 * n, "Part": parts or 2 * n, "DocumentTable": n, "Digitization": n,
+            "PhysDesc": n, "Stemma": n // 10 + 1, "Scripta": n // 5 + 1, "Story": n // 4 + 1, "Genre": 50}
+
+
+def build_db(path: Path | str, scale: float = 1, seed: int = 1, parts: int = None) -> dict:
+    """
+    Write the synthetic tables in a new db file, return the number of records of each table
+    """
+    import duckdb
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    size = sizes(scale, parts)
+    n = size["TextTable"]
+    date = DATE_STRUCT.format(year="1100 + (i * 7) % 400")
+    languages = "['" + "', '".join(LANGUAGES) + "']"
+    status = "['" + "', '".join(REVIEW_STATUS) + "']"
+    with duckdb.connect(path) as con:
+        con.execute(f"SELECT setseed({seed / 100})")
+        con.execute("CREATE TABLE rty (rty_ID INTEGER, rty_Name VARCHAR);")
+        con.executemany("INSERT INTO rty VALUES (?, ?);", RECORD_TYPES)
+        for table in ["rtg", "rst", "dty", "trm"]:
+            con.execute(f"CREATE TABLE {table} (id INTEGER);")
+        con.execute(f"""CREATE TABLE TextTable AS SELECT 1000000 + i AS "H-ID", 101 AS type_id,
+            'text ' || i AS title,
+            CASE WHEN i % 13 = 0 THEN NULL ELSE {languages}[1 + i % 6] END AS language_COLUMN,
+            {status}[1 + (i % 4 > 0)::INT] AS review_status,
+            CASE WHEN i % 3 = 0 THEN [7000000 + i % {size["Stemma"]}, 7000000 + (i + 1) % {size["Stemma"]}]
+                 WHEN i % 3 = 1 THEN []::BIGINT[] END AS "in_stemma H-ID",
+            {date} AS date_of_creation,
+            CASE WHEN i % 5 = 0 THEN NULL ELSE 'incipit ' || i END AS incipit,
+            CASE WHEN i % 7 = 0 THEN NULL ELSE ['verse', 'prose'][1 + i % 2] END AS form
+            FROM range({n}) r(i)""")
+        # pages: empty, duplicated, or pointing to a part which does not exist
+        con.execute(f"""CREATE TABLE Witness AS SELECT 2000000 + i AS "H-ID", 102 AS type_id,
+            CASE WHEN i % 17 = 0 THEN NULL ELSE 1000000 + (i * 31) % {n} END AS "is_manifestation_of H-ID",
+            CASE WHEN i % 9 = 0 THEN NULL WHEN i % 9 = 1 THEN []::BIGINT[]
+                 WHEN i % 9 = 2 THEN [3000000 + i % {size["Part"]}, 9900000 + i]
+                 ELSE [3000000 + i % {size["Part"]}, 3000000 + (i * 3) % {size["Part"]}] END
+                 AS "observed_on_pages H-ID",
+            CASE WHEN i % 6 = 0 THEN NULL WHEN i % 6 = 1 THEN ['lost'] ELSE ['complete', 'fragment'] END
+                 AS status_witness,
+            {status}[1 + (i % 3 > 0)::INT] AS review_status,
+            {date} AS date_of_creation,
+            CASE WHEN i % 2 = 0 THEN NULL ELSE 'siglum ' || i END AS siglum
+            FROM range({size["Witness"]}) r(i)""")
+        con.execute(f"""CREATE TABLE Part AS SELECT 3000000 + i AS "H-ID", 103 AS type_id,
+            CASE WHEN i % 11 = 0 THEN NULL ELSE 4000000 + i % {n} END AS "is_inscribed_on H-ID",
+            CASE WHEN i % 5 = 0 THEN NULL ELSE 6000000 + i % {size["PhysDesc"]} END AS "physical_description H-ID",
+            {status}[1 + (i % 4 > 0)::INT] AS review_status,
+            CASE WHEN i % 3 = 0 THEN NULL ELSE i % 200 END AS number_of_folios,
+            CASE WHEN i % 8 = 0 THEN NULL ELSE ['gothic', 'caroline'] END AS script_type
+            FROM range({size["Part"]}) r(i)""")
+        con.execute(f"""CREATE TABLE DocumentTable AS SELECT 4000000 + i AS "H-ID", 104 AS type_id,
+            CASE WHEN i % 3 = 0 THEN NULL ELSE 'MS ' || i END AS shelfmark,
+            CASE WHEN i % 4 = 0 THEN NULL ELSE 'collection ' || i % 40 END AS collection,
+            {status}[1 + (i % 5 > 0)::INT] AS review_status,
+            {date} AS date_of_creation
+            FROM range({size["DocumentTable"]}) r(i)""")
+        con.execute(f"""CREATE TABLE Digitization AS SELECT 5000000 + i AS "H-ID", 105 AS type_id,
+            CASE WHEN i % 7 = 0 THEN NULL ELSE [4000000 + i % {n}, 4000000 + (i * 5) % {n}] END
+                 AS "digitization_of H-ID",
+            CASE WHEN i % 2 = 0 THEN NULL ELSE 'https://gallica.bnf.fr/' || i END AS URL
+            FROM range({size["Digitization"]}) r(i)""")
+        con.execute(f"""CREATE TABLE PhysDesc AS SELECT 6000000 + i AS "H-ID", 106 AS type_id,
+            CASE WHEN i % 3 = 0 THEN NULL WHEN i % 3 = 1 THEN 'parchment' ELSE 'papyrus' END AS material,
+            {status}[1 + (i % 2 > 0)::INT] AS review_status
+            FROM range({size["PhysDesc"]}) r(i)""")
+        con.execute(f"""CREATE TABLE Stemma AS SELECT 7000000 + i AS "H-ID", 107 AS type_id,
+            CASE WHEN i % 2 = 0 THEN NULL ELSE 'stemma ' || i END AS title
+            FROM range({size["Stemma"]}) r(i)""")
+        con.execute(f"""CREATE TABLE Scripta AS SELECT 8000000 + i AS "H-ID", 108 AS type_id,
+            {languages}[1 + i % 6] AS language_COLUMN,
+            {status}[1 + (i % 2 > 0)::INT] AS review_status,
+            CASE WHEN i % 3 = 0 THEN NULL ELSE 'scripta ' || i END AS name_COLUMN
+            FROM range({size["Scripta"]}) r(i)""")
+        for (type_id, table) in [(109, "Story"), (110, "Genre")]:
+            con.execute(f"""CREATE TABLE {table} AS SELECT 9000000 + {type_id} * 10000 + i AS "H-ID",
+                {type_id} AS type_id,
+                CASE WHEN i % 3 = 0 THEN NULL ELSE '{table} ' || i END AS name_COLUMN,
+                CASE WHEN i % 5 = 0 THEN NULL WHEN i % 5 = 1 THEN ['unknown'] ELSE ['epic'] END AS category,
+                {status}[1 + (i % 2 > 0)::INT] AS review_status
+                FROM range({size[table]}) r(i)""")
+    return size
+
+
+def vocabulary(terms: list[str]) -> str:
+    # the vocabTerms of the CLI: a DuckDB map of each term to its description
+    return "{" + ", ".join(f"{term}={{'description': NULL, 'url': NULL, 'id': {i}}}"
+                           for (i, term) in enumerate(terms)) + "}"
+
+
+SCHEMA = {
+    # table: [(field, type, pointer targets, requirement, vocabulary)]
+    "TextTable": [("title", "freetext", "[]", "required", None),
+                  ("language", "enum", "[]", "required", LANGUAGES[:5]),
+                  ("review_status", "enum", "[]", "recommended", REVIEW_STATUS),
+                  ("in_stemma", "resource", "[107]", "optional", None),
+                  ("date_of_creation", "date", "[]", "recommended", None),
+                  ("incipit", "freetext", "[]", "optional", None),
+                  ("form", "freetext", "[]", "hidden", None)],
+    "Witness": [("is_manifestation_of", "resource", "[101]", "required", None),
+                ("observed_on_pages", "resource", "[103]", "required", None),
+                ("status_witness", "enum", "[]", "recommended", ["complete", "fragment"]),
+                ("review_status", "enum", "[]", "recommended", REVIEW_STATUS),
+                ("date_of_creation", "date", "[]", "optional", None),
+                ("siglum", "freetext", "[]", "optional", None)],
+    "Part": [("is_inscribed_on", "resource", "[104]", "required", None),
+             ("physical_description", "resource", "[106]", "optional", None),
+             ("review_status", "enum", "[]", "recommended", REVIEW_STATUS),
+             ("number_of_folios", "integer", "[]", "optional", None),
+             ("script_type", "enum", "[]", "optional", ["gothic", "caroline"])],
+    "DocumentTable": [("shelfmark", "freetext", "[]", "required", None),
+                      ("collection", "freetext", "[]", "optional", None),
+                      ("review_status", "enum", "[]", "recommended", REVIEW_STATUS),
+                      ("date_of_creation", "date", "[]", "optional", None)],
+    "Digitization": [("digitization_of", "resource", "[104]", "required", None),
+                     ("URL(s)", "freetext", "[]", "optional", None)],
+    "PhysDesc": [("material", "enum", "[]", "recommended", ["parchment", "paper"]),
+                 ("review_status", "enum", "[]", "recommended", REVIEW_STATUS)],
+    "Stemma": [("title", "freetext", "[]", "required", None)],
+    "Scripta": [("language", "enum", "[]", "required", LANGUAGES),
+                ("review_status", "enum", "[]", "recommended", REVIEW_STATUS),
+                ("name", "freetext", "[]", "optional", None)],
+    "Story": [("name", "freetext", "[]", "required", None),
+              ("category", "enum", "[]", "optional", ["epic"]),
+              ("review_status", "enum", "[]", "recommended", REVIEW_STATUS)],
+    "Genre": [("name", "freetext", "[]", "required", None),
+              ("category", "enum", "[]", "optional", ["epic"]),
+              ("review_status", "enum", "[]", "recommended", REVIEW_STATUS)],
+}
+SCHEMA_COLUMNS = ["dty_ID", "dty_Name", "rst_DisplayName", "dty_Type", "dty_PtrTargetRectypeIDs",
+                  "rst_RequirementType", "vocabTerms"]
+
+
+def build_schema(schema_dir: Path | str) -> None:
+    """
+    Write one CSV file per table, like `heurist schema -t csv`
+    """
+    schema_dir = Path(schema_dir)
+    schema_dir.mkdir(parents=True, exist_ok=True)
+    for file in schema_dir.glob("*.csv"):
+        file.unlink()
+    for (table, fields) in SCHEMA.items():
+        with open(schema_dir / f"{table}.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=SCHEMA_COLUMNS)
+            writer.writeheader()
+            writer.writerow({"dty_ID": 0, "dty_Name": "Header 1", "rst_DisplayName": "Header",
+                             "dty_Type": "separator", "dty_PtrTargetRectypeIDs": "[]",
+                             "rst_RequirementType": "optional", "vocabTerms": ""})
+            for (i, (name, field_type, pointers, requirement, terms)) in enumerate(fields, 1):
+                writer.writerow({"dty_ID": i, "dty_Name": name, "rst_DisplayName": name,
+                                 "dty_Type": field_type, "dty_PtrTargetRectypeIDs": pointers,
+                                 "rst_RequirementType": requirement,
+                                 "vocabTerms": vocabulary(terms) if terms else ""})
+
+
+def build_log(log_path: Path | str, size: dict, records: int = None, seed: int = 1) -> None:
+    """
+    Write a validation log of the Heurist-API CLI, with some invalid records of each table
+    """
+    rnd = random.Random(seed)
+    tables = [("TextTable", 101, 1000000), ("Witness", 102, 2000000), ("Part", 103, 3000000),
+              ("DocumentTable", 104, 4000000)]
+    records = records or size["Witness"]
+    with open(log_path, "w") as f:
+        for i in range(records):
+            (table, type_id, first_id) = rnd.choice(tables)
+            f.write(f"2025-01-01 10:{i // 60 % 60:02d}:{i % 60:02d} - WARNING - invalid record\n"
+                    f"\t[rty_ID: {type_id}]\n"
+                    f"\t[rec_ID: {first_id + rnd.randrange(size[table])}]\n"
+                    f"\tRule: required field\n"
+                    f"\tProblem: missing value\n")
+
+
+def build(directory: Path | str, scale: float = 1, seed: int = 1) -> tuple[Path, Path, Path]:
+    """
+    Build lostma.db, jbcamps_gestes_schema/ and validation.log in a directory
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    db_path = directory / "lostma.db"
+    schema_dir = directory / "jbcamps_gestes_schema"
+    log_path = directory / "validation.log"
+    size = build_db(db_path, scale, seed)
+    build_schema(schema_dir)
+    build_log(log_path, size, seed=seed)
+    return db_path, schema_dir, log_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a synthetic LostMa db")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--scale", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(*build(args.directory, args.scale, args.seed), sep="\n")
@@ -0,0 +1,66 @@
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import synthetic
+from lostma_db import LostmaDB
+
+"""
+Benchmark of LostmaDB.witnesses() on a synthetic db: the former list_contains join of Part
+against the current equality join on the witness -> part edges
+    python benchmarks/witnesses_join.py [--scale 33.4] [--parts 100000]  (100,000 witnesses, 100,000 parts)
+The rows of both joins are compared one for one (EXCEPT ALL in both directions)
+"""
+
+# the join of Part used before the witness -> part edges
+LIST_CONTAINS_JOINS = [
+    {"type_join": "LEFT JOIN", "table": "TextTable",
+     "on": "ON witness.\"is_manifestation_of H-ID\" = TextTable.\"H-ID\" "},
+    {"type_join": "LEFT JOIN", "table": "Part",
+     "on": "ON list_contains(witness.\"observed_on_pages H-ID\", part.\"H-ID\") = TRUE "},
+    {"type_join": "LEFT JOIN", "table": "DocumentTable",
+     "on": "ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\" "},
+]
+
+
+def timed(db: LostmaDB, name: str, query: str) -> float:
+    start = time.perf_counter()
+    db.sql(f"CREATE TEMP TABLE {name} AS {query}", is_df=False)
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark of the witnesses join")
+    parser.add_argument("--scale", type=float, default=33.4, help="scale of the synthetic db")
+    parser.add_argument("--parts", type=int, default=100_000, help="number of parts")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "lostma.db"
+        size = synthetic.build_db(db_path, args.scale, parts=args.parts)
+        db = LostmaDB(None, None, duckdb_path=db_path, cache_bytes=0)
+        condition, joins = db._witnesses_joins()
+        new_time = timed(db, "new_join", db._table_query("Witness", condition, joins))
+        old_time = timed(db, "old_join", db._table_query("Witness", "", LIST_CONTAINS_JOINS))
+        (rows, only_old, only_new) = db.sql(
+            "SELECT (SELECT count(*) FROM new_join), "
+            "(SELECT count(*) FROM (FROM old_join EXCEPT ALL FROM new_join)), "
+            "(SELECT count(*) FROM (FROM new_join EXCEPT ALL FROM old_join));",
+            is_df=False,
+        ).fetchone()
+        db._close_connection()
+    print(f"{size['Witness']} witnesses, {size['Part']} parts, {rows} rows")
+    print(f"list_contains join: {old_time:.3f} s")
+    print(f"equality join:      {new_time:.3f} s  (x{old_time / new_time:.1f})")
+    if only_old or only_new:
+        print(f"FAIL: {only_old} rows only in the former join, {only_new} only in the new one")
+        return 1
+    print("same rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,9 @@
-from .client import LostmaDB, interval
\ No newline at end of file
+from .client import LostmaDB, interval
+
+
+def __getattr__(name: str):
+    # the asyncio API is imported on first access, asyncio is not needed otherwise
+    if name == "AsyncLostmaDB":
+        from .aio import AsyncLostmaDB
+        return AsyncLostmaDB
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import asyncio
+import contextvars
+import functools
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .client import LostmaDB
+
+"""
+Here is the asyncio API of LostmaDB, for an application with an event loop (ex: a web dashboard)
+    The requests run in a bounded pool of threads: the loop is never blocked by DuckDB
+    The downloads of a sync are subprocesses of the loop: their output is streamed, they can be cancelled,
+    and the requests go on against the current db until the new tables are swapped in
+"""
+
+# a line of output of the CLI (its progress bars can be long)
+LINE_LIMIT = 1024 * 1024
+
+
+class AsyncLostmaDB:
+    """
+    asyncio facade of a LostmaDB, built from the same arguments or given as db
+        max_workers: number of requests running at the same time, the next ones wait without blocking the loop
+    """
+    def __init__(self, login=None, password=None, duckdb_path: str | Path | None = None,
+                 max_workers: int = 4, db: LostmaDB = None, **kwargs):
+        self.db = db if db is not None else LostmaDB(login, password, duckdb_path, **kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lostma")
+
+    async def __aenter__(self) -> AsyncLostmaDB:
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Wait for the requests in progress, then close the db"""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self.db._close_connection()
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking function (ex: a method of self.db) in the pool of the requests"""
+        # the context goes with the request, ex: the method tags of the profiling
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def sql(self, query: str, params: list = None, result_format: str = "pandas"):
+        return await self.run(self.db.sql, query, params, result_format=result_format)
+
+    async def table(self, base_table: str, condition: str = None, joins: list[dict] = None,
+                    result_format: str = "pandas"):
+        return await self.run(self.db.table, base_table, condition, joins, result_format=result_format)
+
+    async def texts(self, languages: list | str = None, result_format: str = "pandas"):
+        return await self.run(self.db.texts, languages, result_format=result_format)
+
+    async def witnesses(self, languages: list | str = None, result_format: str = "pandas"):
+        return await self.run(self.db.witnesses, languages, result_format=result_format)
+
+    async def tradition(self, languages: list = None, result_format: str = "pandas"):
+        return await self.run(self.db.tradition, languages, result_format=result_format)
+
+    async def analyse(self, name_table: str = None, language: str = None,
+                      result_format: str = "pandas") -> dict | str:
+        return await self.run(self.db.analyse, name_table, language, result_format=result_format)
+
+    async def analyse_all(self, languages: list | str = None, result_format: str = "pandas"):
+        return await self.run(self.db.analyse_all, languages, result_format=result_format)
+
+    async def dated(self, base_table: str, attribute: str, year_min: int, year_max: int,
+                    result_format: str = "pandas"):
+        return await self.run(self.db.dated, base_table, attribute, year_min, year_max,
+                              result_format=result_format)
+
+    async def tradition_graph(self):
+        return await self.run(self.db.tradition_graph)
+
+    async def sync(self, type_table: str | list[str] = None, incremental: bool = False,
+                   timeout: float = None, retries: int = 1, corpus_tables: bool = False,
+                   on_progress=None) -> None:
+        """
+        Download the db and its schema without blocking the loop (see LostmaDB.sync)
+            The record type groups and the schema are downloaded concurrently in staging files,
+            while the requests go on against the current db; then the tables are swapped in
+            on_progress is called with each line of output of the CLI (print by default)
+            Cancelling the sync kills the downloads and leaves the db as it was
+        """
+        db = self.db
+        db._check_db_file()
+        if isinstance(type_table, str):
+            type_table = [type_table]
+        on_progress = on_progress or print
+        group_args, staging_dbs, staging_schema = db._staging_plan(type_table or [])
+        # the lock of LostmaDB.sync: one sync at a time, from the loop or from a thread
+        await self._acquire_sync_lock()
+        try:
+            db._clean_staging(staging_dbs, staging_schema)
+            downloads = [asyncio.ensure_future(self._cli(db._download_command(type_arg, staging_db),
+                                                         " ".join(type_arg), timeout, retries, on_progress))
+                         for (type_arg, staging_db) in zip(group_args, staging_dbs)]
+            downloads.append(asyncio.ensure_future(self._cli(
+                db._schema_command([arg for type_arg in group_args for arg in type_arg], staging_schema),
+                "schema", timeout, retries, on_progress)))
+            try:
+                await asyncio.gather(*downloads)
+            except BaseException:
+                # a failed download stops the others
+                for download in downloads:
+                    download.cancel()
+                await asyncio.gather(*downloads, return_exceptions=True)
+                raise
+            swap = asyncio.ensure_future(self.run(db._apply_staging, staging_dbs, staging_schema,
+                                                  incremental, corpus_tables))
+            try:
+                await asyncio.shield(swap)
+            except asyncio.CancelledError:
+                # the swap is not stopped halfway: it ends before the staging files are removed
+                await swap
+                raise
+        finally:
+            db._clean_staging(staging_dbs, staging_schema)
+            db._sync_lock.release()
+
+    async def _acquire_sync_lock(self) -> None:
+        """Wait for the sync lock of the db in a thread, without blocking the loop"""
+        lock = self.db._sync_lock
+        # the thread gives the lock back itself if the sync was cancelled in the meantime
+        guard, state = threading.Lock(), {"acquired": False, "cancelled": False}
+
+        def acquire():
+            lock.acquire()
+            with guard:
+                if state["cancelled"]:
+                    lock.release()
+                else:
+                    state["acquired"] = True
+
+        # not in the pool of the requests: a long sync of a thread would hold one of its workers
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, acquire)
+        except asyncio.CancelledError:
+            with guard:
+                if state["acquired"]:
+                    lock.release()
+                state["cancelled"] = True
+            raise
+
+    @staticmethod
+    async def _cli(cmd: list[str], label: str, timeout: float, retries: int, on_progress) -> None:
+        """Run the CLI, streaming its output, again if it fails or takes longer than timeout"""
+        for attempt in LostmaDB._download_attempts(retries, label, on_progress):
+            with attempt:
+                return await _run_cli(cmd, timeout, on_progress)
+
+
+async def _run_cli(cmd: list[str], timeout: float, on_progress) -> None:
+    """Run the CLI once, streaming its output (CalledProcessError or TimeoutExpired if it fails)"""
+    process = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.STDOUT, limit=LINE_LIMIT)
+    try:
+        await asyncio.wait_for(_stream(process, on_progress), timeout)
+    except BaseException as error:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        if isinstance(error, asyncio.TimeoutError):
+            raise subprocess.TimeoutExpired(cmd, timeout) from None
+        raise
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+async def _stream(process: asyncio.subprocess.Process, on_progress) -> None:
+    async for line in process.stdout:
+        on_progress(line.decode(errors="replace").rstrip())
+    await process.wait()
@@ -1,9 +1,13 @@
+from __future__ import annotations
 from pathlib import Path
-import duckdb
-import csv
-import ast
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 from .background import yield_log_blocks
-from.general import def_requirements, KEYWORDS
+from.general import def_requirements, count_empty_expr, compile_schema
+from .lostma_tables import INTERNAL_TABLES, LOG_TABLE, LOG_STATE_TABLE
+
+if TYPE_CHECKING:
+    import duckdb
 
 """
 Here are some general check-up functions, not use for now in this library. But I want to keep them here
@@ -21,115 +25,227 @@ BASE_TABLES = [
         ("dty", "DetailTypes"),
         ("trm", "Terms"),
     ]
+LOG_COLUMNS = ["time", "level", "recType", "recID", "rule", "problem"]
+LOG_BATCH_SIZE = 50_000
+LOG_HEAD_SIZE = 256
 
 
 def log_data() -> dict:
-    # Analyse log data
+    # Analyse log data: record IDs with a problem, sorted for each record type
+    recs = {}
     if VALIDATION_LOG.is_file():
         with open(VALIDATION_LOG) as f:
-            log = f.readlines()
-    else:
-        log = []
+            for block in yield_log_blocks(f):
+                recs.setdefault(block.recType, set()).add(block.recID)
+    return {rec_type: sorted(rec_ids) for (rec_type, rec_ids) in recs.items()}
 
-    recs = {}
-    for block in yield_log_blocks(log):
-        if block.recType not in recs:
-            recs[block.recType] = [block.recID]
-        else:
-            if block.recID not in recs[block.recType]:
-                recs[block.recType].append(block.recID)
-    return recs
+def load_log(con: duckdb.DuckDBPyConnection, log_path: Path = None, final: bool = False) -> int:
+    # Parse the whole log file again and store its blocks in the Duck DB
+    con.execute(f"DROP TABLE IF EXISTS {LOG_STATE_TABLE};")
+    con.execute(f"DROP TABLE IF EXISTS {LOG_TABLE};")
+    return follow_log(con, log_path, final)
+
+def follow_log(con: duckdb.DuckDBPyConnection, log_path: Path = None, final: bool = False) -> int:
+    # Store in the Duck DB the blocks appended to the log file since the last call, by batches
+    # The inode, the last offset read and the first bytes of the file detect a rotation or a truncation
+    # A last line without its newline is read once the file is unchanged since the last call (its size
+    # and mtime), or at once with final (ex: the CLI has exited)
+    log_path = log_path or VALIDATION_LOG
+    con.execute(f"CREATE TABLE IF NOT EXISTS {LOG_TABLE} (time VARCHAR, level VARCHAR, recType INTEGER, "
+                "recID INTEGER, rule VARCHAR, problem VARCHAR);")
+    con.execute(f"CREATE TABLE IF NOT EXISTS {LOG_STATE_TABLE} (inode BIGINT, \"offset\" BIGINT, head BLOB, "
+                "size BIGINT, mtime BIGINT);")
+    # the state of a former version has no size and no mtime
+    for column in ["size", "mtime"]:
+        con.execute(f"ALTER TABLE {LOG_STATE_TABLE} ADD COLUMN IF NOT EXISTS {column} BIGINT;")
+    if not log_path.is_file():
+        return 0
+    stat = log_path.stat()
+    count = 0
+    with open(log_path, "rb") as f:
+        head = f.read(LOG_HEAD_SIZE)
+        state = con.execute(f"SELECT inode, \"offset\", head, size, mtime FROM {LOG_STATE_TABLE};").fetchone()
+        unchanged = bool(state) and tuple(state[3:]) == (stat.st_size, stat.st_mtime_ns)
+        con.execute("BEGIN TRANSACTION;")
+        try:
+            if state and state[0] == stat.st_ino and state[1] <= stat.st_size and head.startswith(state[2]):
+                offset = state[1]
+            else:
+                # new or rotated log: start again from the beginning
+                con.execute(f"DELETE FROM {LOG_TABLE};")
+                offset = 0
+            f.seek(offset)
+            position = offset
+
+            def complete_lines():
+                nonlocal position
+                for raw_line in f:
+                    # the last line is still being written, unless the file no longer changes
+                    # (only up to the size seen unchanged: the writer may have started again since)
+                    if not raw_line.endswith(b"\n") and not (
+                            final or (unchanged and position + len(raw_line) == stat.st_size)):
+                        return
+                    position += len(raw_line)
+                    # a blank line (ex: the newline of a last line read before it) starts no block
+                    if raw_line.strip():
+                        yield raw_line.decode()
+
+            batch = []
+            for block in yield_log_blocks(complete_lines()):
+                batch.append((block.time, block.level, block.recType, block.recID, block.rule, block.problem))
+                # the block is complete: the next call can start after it
+                offset = position
+                if len(batch) == LOG_BATCH_SIZE:
+                    count += insert_log_batch(con, batch)
+                    batch = []
+            if batch:
+                count += insert_log_batch(con, batch)
+            con.execute(f"DELETE FROM {LOG_STATE_TABLE};")
+            con.execute(f"INSERT INTO {LOG_STATE_TABLE} (inode, \"offset\", head, size, mtime) "
+                        "VALUES (?, ?, ?, ?, ?);", [stat.st_ino, offset, head, stat.st_size, stat.st_mtime_ns])
+            con.execute("COMMIT;")
+        except Exception:
+            con.execute("ROLLBACK;")
+            raise
+    return count
 
-def count_log() -> dict:
+def insert_log_batch(con: duckdb.DuckDBPyConnection, batch: list[tuple]) -> int:
+    # one list per column, unnested side by side: no scan of a python variable, which breaks
+    # when another connection of the same instance opens or closes at the same time
+    con.execute(f"INSERT INTO {LOG_TABLE} SELECT {', '.join(['UNNEST(?)'] * len(LOG_COLUMNS))};",
+                [list(column) for column in zip(*batch)])
+    return len(batch)
+
+def count_log(refresh: bool = False, db_path: Path = None, log_path: Path = None) -> dict:
     # summary most problematic data with content of log file
-    mistakes, collect_mistakes = log_data(), {}
-    with duckdb.connect(duck_db_path) as con:
-        tables = [t[0] for t in con.sql("show tables;").fetchall()]
-        for table in tables:
-            # Je pourrai ici aussi m'inspirer de la fonction safe_sql
-            table = table[0].lower() + table[1:].replace("Table", "")
-            if table not in [t[0] for t in BASE_TABLES]:
-                table_id = con.sql(f"SELECT rty_ID FROM rty WHERE rty_Name = '{table}';").fetchone()[0]
-                if table_id in mistakes:
-                    len_table = con.sql(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
-                    count_mistakes = len(mistakes[table_id])
-                    collect_mistakes[table] = {'records on log': count_mistakes,
-                                               'total records': len_table,
-                                               'percentage problem':round((count_mistakes / len_table) * 100, 2)}
+    # the paths of the reports are the ones of the module by default (duck_db_path, VALIDATION_LOG...)
+    # the log is stored in the db: it is opened in write mode
+    import duckdb
+    collect_mistakes = {}
+    with duckdb.connect(db_path or duck_db_path) as con:
+        if refresh:
+            load_log(con, log_path)
+        else:
+            follow_log(con, log_path)
+        excluded = [t[0] for t in BASE_TABLES] + INTERNAL_TABLES
+        tables = [t[0] for t in con.sql("show tables;").fetchall() if t[0] not in excluded]
+        if not tables:
+            return collect_mistakes
+        # Je pourrai ici aussi m'inspirer de la fonction safe_sql
+        names = [(table, table[0].lower() + table[1:].replace("Table", "")) for table in tables]
+        # a single request: the names of the tables are matched with rty, then with the log and the table sizes
+        counts = " UNION ALL ".join(f"SELECT '{table}' AS sql_table, count(*) AS len_table FROM \"{table}\""
+                                    for table in tables)
+        rows = con.execute(
+            f"WITH names AS (SELECT UNNEST(?) AS sql_table, UNNEST(?) AS rty_Name), "
+            f"mistakes AS (SELECT recType, count(DISTINCT recID) AS count_mistakes FROM {LOG_TABLE} "
+            f"GROUP BY recType), "
+            f"counts AS ({counts}) "
+            "SELECT names.rty_Name, mistakes.count_mistakes, counts.len_table FROM names "
+            "INNER JOIN rty ON rty.rty_Name = names.rty_Name "
+            "INNER JOIN mistakes ON mistakes.recType = rty.rty_ID "
+            "INNER JOIN counts ON counts.sql_table = names.sql_table "
+            "ORDER BY names.sql_table;",
+            [[n[0] for n in names], [n[1] for n in names]],
+        ).fetchall()
+        for (table, count_mistakes, len_table) in rows:
+            collect_mistakes[table] = {'records on log': count_mistakes,
+                                       'total records': len_table,
+                                       'percentage problem':round((count_mistakes / len_table) * 100, 2)}
     return collect_mistakes
 
 # print(count_log())
 
-def count_required_data() -> dict:
+def count_required_data(db_path: Path = None, schema_dir: Path = None, read_only: bool = False) -> dict:
     # collect records with empty data on required fields
-    required_data = def_requirements(schema_path, "required")
+    import duckdb
+    required_data = def_requirements(schema_dir or schema_path, "required")
     collect = {}
-    with duckdb.connect(duck_db_path) as con:
+    with duckdb.connect(db_path or duck_db_path, read_only=read_only) as con:
+        existing = [t[0] for t in con.sql("show tables;").fetchall()]
+        counts = []
         for table in required_data:
             list_detail = []
             for detail in required_data[table]:
                 if required_data[table][detail] == "required":
                     list_detail.append(f"\"{detail}\" IS NULL")
-            if list_detail:
-                query = f"FROM {table} WHERE "
-                query += " OR ".join(list_detail)
-                len_table = con.sql(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
-                count_empty = con.sql("SELECT count (*)" + query).fetchone()[0]
+            if list_detail and table in existing:
+                # the total and the empty required records in the same scan
+                counts.append(f"SELECT '{table}', count(*), count(*) FILTER (WHERE {' OR '.join(list_detail)}) "
+                              f"FROM \"{table}\"")
+        if counts:
+            for (table, len_table, count_empty) in con.sql(" UNION ALL ".join(counts) + ";").fetchall():
                 collect[table] = {'empty required records': count_empty,
                                   'total records': len_table,
                                   'percentage problem': round((count_empty / len_table) * 100, 2)}
-    return  collect
+    # same order as the schema files
+    return {table: collect[table] for table in required_data if table in collect}
 
 # print(count_required_data())
 
 def collect_presence_data(
-    column_names: list[dict | str] = None
+    column_names: list[dict | str] = None,
+    max_workers: int = 4,
+    db_path: Path = None,
+    schema_dir: Path = None,
+    read_only: bool = False,
 ) -> tuple[dict, str]:
     # summary presence of data in the Duck DB
     # note: il existe apparemment un moyen de scoper les tables en fonction d'un critère
     # puis de rendre récurcif ce scope sur les autres tables à partir desquelles elle est liée
     # ça ferait une étape supplémentaire préalable à l'utilisation de cette fonction sur
     # une view sql déjà préparée, mais on peut essayer de l'envisager
+    import duckdb
     collect, log_data = {}, []
-    required_data = def_requirements(schema_path)
-    with duckdb.connect(duck_db_path) as con:
+    required_data = def_requirements(schema_dir or schema_path)
+    with duckdb.connect(db_path or duck_db_path, read_only=read_only) as con:
+        col_types = {}
+        for (table, column, dtype) in con.sql("SELECT table_name, column_name, data_type "
+                                              "FROM information_schema.columns;").fetchall():
+            col_types.setdefault(table, {})[column] = dtype
         # if no input data, search for everything
         if not column_names:
-            column_names = []
-            tables = [t[0] for t in con.sql("show tables;").fetchall()]
-            for table in tables:
-                if table not in [t[0] for t in BASE_TABLES]:
-                    name_columns = con.sql(f"SELECT column_name FROM information_schema.columns "
-                                           f"WHERE table_name = '{table}';")
-                    columns = [t[0] for t in name_columns.fetchall()]
-                    column_names.append({table: columns})
+            excluded = [t[0] for t in BASE_TABLES] + INTERNAL_TABLES
+            column_names = [{table: list(col_types[table])} for table in col_types if table not in excluded]
         # if no precised column, search for everything in the table
+        selection = []
         for table in column_names:
             if not isinstance(table, dict):
                 # Je pourrai ici aussi m'inspirer de la fonction safe_sql
                 table = table[0].upper() + table[1:]
-                name_columns = con.sql(f"SELECT column_name FROM information_schema.columns "
-                                       f"WHERE table_name = '{table}';")
-                columns = [t[0] for t in name_columns.fetchall()]
-                column_names.append({table: columns})
-        for table in column_names:
-            if isinstance(table, dict):
-                name_table = [t for t in table.keys()][0]
-                len_table = con.sql(f"SELECT COUNT(*) FROM {name_table};").fetchone()[0]
-                collect[name_table] = {}
-                details = [d for l in table.values() for d in l if d not in ["H-ID", "type_id"] and "TRM-ID" not in d]
-                for detail in details:
-                    if detail in required_data[name_table]:
-                        req_type = required_data[name_table][detail]
-                        query = f"SELECT count (*) FROM {name_table} WHERE \"{detail}\" IS NULL"
-                        count_empty = con.sql(query).fetchone()[0]
-                        collect[name_table][detail] = {'required statement' : req_type,
-                                                       'empty records': count_empty,
-                                                       'total records': len_table,
-                                                       'percentage empty': round((count_empty / len_table) * 100, 2)}
-                    else:
-                        log_data.append(f"{name_table}.{detail}")
-            log_return = f"fields {", ".join(log_data)} are hidden"
+                table = {table: list(col_types.get(table, {}))}
+            selection.append(table)
+        # one aggregate per table, with all its documented fields
+        queries = {}
+        for table in selection:
+            name_table = [t for t in table.keys()][0]
+            details = [d for l in table.values() for d in l if d not in ["H-ID", "type_id"] and "TRM-ID" not in d]
+            agg_expr = ["count(*)"]
+            collect[name_table] = {}
+            for detail in details:
+                if detail in required_data.get(name_table, {}):
+                    collect[name_table][detail] = {}
+                    agg_expr.append(count_empty_expr(name_table, detail, col_types[name_table][detail]))
+                else:
+                    log_data.append(f"{name_table}.{detail}")
+            queries[name_table] = f"SELECT {', '.join(agg_expr)} FROM \"{name_table}\";"
+
+        def scan(query):
+            # a cursor per thread: the tables are scanned in parallel
+            with con.cursor() as cursor:
+                return cursor.execute(query).fetchone()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            rows = dict(zip(queries, pool.map(scan, queries.values())))
+        for name_table in queries:
+            len_table, *counts = rows[name_table]
+            for (detail, count_empty) in zip(collect[name_table], counts):
+                req_type = required_data[name_table][detail]
+                collect[name_table][detail] = {'required statement' : req_type,
+                                               'empty records': count_empty,
+                                               'total records': len_table,
+                                               'percentage empty': round((count_empty / len_table) * 100, 2)}
+    log_return = f"fields {", ".join(log_data)} are hidden"
     return collect, log_return
 
 # print(collect_presence_data(["witness"]))
@@ -139,59 +255,66 @@ def def_enum(
 ) -> dict:
     # Import the predefined vocabulary of fields from the schema of tables
     data = {}
-    for file in path.iterdir():
-        file_name = file.name.split(".")[0]
-        data[file_name] = {}
-        with open(file, 'r') as csv_file:
-            reader = csv.DictReader(csv_file, delimiter=',')
-            for row in reader:
-                # Il faut nettoyer 2-3 trucs issus de la table Stemma...
-                # En fait il faudrait que le schéma soit rédigé avec les mêmes transfo que les tables de la DuckDB
-                name_detail = row['rst_DisplayName']
-                if "-" in name_detail:
-                    name_detail = name_detail.replace("-", " ")
-                if name_detail == "URL(s)":
-                    name_detail = "URL"
-                # Si c'est une clé étrangère, il me faut ajouter un H-ID
-                foreign_key = ast.literal_eval(row['dty_PtrTargetRectypeIDs'])
-                if foreign_key:
-                    name_detail += " H-ID"
-                # Je reprends ici des trucs présent dans le fichier sql_safety de l'Heurist-API
-                if name_detail.lower() in KEYWORDS:
-                    name_detail = f"{name_detail}_COLUMN"
-                # J'enlève les éléments du Header
-                if "Header" not in row['dty_Name']:
-                    if row['dty_Type'] == "enum":
-                        vocab_terms = [t.split("={")[0].replace("{", "").replace("\'", "").replace("\\\\\\", "\'")
-                                       for t in row['vocabTerms'].split("}, ")]
-                        data[file_name][name_detail] = vocab_terms
+    for (file_name, fields) in compile_schema(path).items():
+        data[file_name] = {name: field.vocab_terms for (name, field) in fields.items()
+                           if field.field_type == "enum"}
     return data
 
-def validation_enum() -> dict:
+def validation_enum(sample_size: int = 5, db_path: Path = None, schema_dir: Path = None,
+                    read_only: bool = False) -> dict:
     # summary presence of un undesired data in fields with predefined vocabulary
+    # the vocabularies are loaded in the Duck DB: the values are checked with an anti-join, not in python
+    # (a temporary table, which a db opened in read-only mode accepts too)
+    import duckdb
     collect = {}
-    enums = def_enum(schema_path)
-    with duckdb.connect(duck_db_path) as con:
+    enums = def_enum(schema_dir or schema_path)
+    terms = [(table, enum, term) for table in enums for enum in enums[table] for term in enums[table][enum]]
+    with duckdb.connect(db_path or duck_db_path, read_only=read_only) as con:
+        con.execute("CREATE OR REPLACE TEMP TABLE enum_terms (table_name VARCHAR, column_name VARCHAR, "
+                    "term VARCHAR);")
+        if terms:
+            con.execute("INSERT INTO enum_terms SELECT UNNEST(?), UNNEST(?), UNNEST(?);",
+                        [list(column) for column in zip(*terms)])
+        col_types = {(table, column): dtype for (table, column, dtype) in con.sql(
+            "SELECT table_name, column_name, data_type FROM information_schema.columns;").fetchall()}
+        tables = {table for (table, _) in col_types}
+        values, counts = [], []
         for table in enums:
-            enums_table = enums[table]
-            len_table = con.sql(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
-            if enums_table:
-                for enum in enums_table:
-                    data = con.sql(f"SELECT {enum} FROM {table} WHERE {enum} IS NOT NULL;").fetchall()
-                    # J'ajoute ce filtre car DUckDB comprend le chanp "reference stemma" comme un integer
-                    if data:
-                        if con.sql(f"SELECT typeof({enum}) FROM {table}").fetchone()[0] == "VARCHAR[]":
-                            query = (f"SELECT {enum} FROM {table} WHERE EXISTS ("
-                                     f"SELECT 1 FROM UNNEST({table}.{enum}) AS x "
-                                     f"WHERE x.unnest NOT IN (SELECT * FROM UNNEST(?) AS a(v)));")
-                        else:
-                            query = f"SELECT {enum} FROM {table} WHERE {enum} NOT IN (SELECT * FROM UNNEST(?) AS a(v));"
-                        result = [t[0] for t in con.sql(query, params=[enums_table[enum]]).fetchall()]
-                        count_mistake = len(result)
-                        if result:
-                            collect[table][enum] = {'empty records': count_mistake,
-                                                    'total records': len_table,
-                                                    'percentage problem': round((count_mistake / len_table) * 100, 2)}
+            if not enums[table] or table not in tables:
+                continue
+            counts.append(f"SELECT '{table}' AS table_name, count(*) AS len_table FROM \"{table}\"")
+            for enum in enums[table]:
+                dtype = col_types.get((table, enum))
+                if dtype is None:
+                    continue
+                # J'ajoute un cast car DUckDB comprend le chanp "reference stemma" comme un integer
+                if dtype.endswith("[]"):
+                    value = f"CAST(UNNEST(\"{enum}\") AS VARCHAR)"
+                else:
+                    value = f"CAST(\"{enum}\" AS VARCHAR)"
+                values.append(f"SELECT '{table}' AS table_name, '{enum}' AS column_name, rowid AS rec, "
+                              f"{value} AS value FROM \"{table}\"")
+        if not values:
+            return collect
+        rows = con.execute(
+            f"WITH enum_values AS ({' UNION ALL '.join(values)}), "
+            f"counts AS ({' UNION ALL '.join(counts)}) "
+            "SELECT v.table_name, v.column_name, count(DISTINCT v.rec), "
+            "list_sort(list(DISTINCT v.value))[1:?], any_value(counts.len_table) "
+            "FROM enum_values AS v "
+            "ANTI JOIN enum_terms AS e "
+            "ON e.table_name = v.table_name AND e.column_name = v.column_name AND e.term = v.value "
+            "INNER JOIN counts ON counts.table_name = v.table_name "
+            "WHERE v.value IS NOT NULL "
+            "GROUP BY v.table_name, v.column_name "
+            "ORDER BY v.table_name, v.column_name;",
+            [sample_size],
+        ).fetchall()
+        for (table, enum, count_mistake, sample, len_table) in rows:
+            collect.setdefault(table, {})[enum] = {'empty records': count_mistake,
+                                                   'total records': len_table,
+                                                   'percentage problem': round((count_mistake / len_table) * 100, 2),
+                                                   'sample values': sample}
     return collect
 
 # print(validation_enum())
\ No newline at end of file
@@ -1,5 +1,6 @@
-from typing import Generator
+from typing import Generator, Iterable
 from dataclasses import dataclass
+from itertools import islice
 import re
 
 """
@@ -46,14 +47,15 @@ class LogDetail:
         return re.search(r"[A-Z]+", l1).group(0).strip()
 
 
-def yield_log_blocks(lines: list[str]) -> Generator[LogDetail, None, None]:
+def yield_log_blocks(lines: Iterable[str]) -> Generator[LogDetail, None, None]:
+    # lines can be an open file: it is read lazily, line by line
     line_iterator = iter(lines)
     l1 = next(line_iterator, None)
     while l1 is not None:
         if l1 and not l1.startswith("\t"):
-            l2 = next(line_iterator)
-            l3 = next(line_iterator)
-            l4 = next(line_iterator)
-            l5 = next(line_iterator)
-            yield LogDetail.load_lines(l1, l2, l3, l4, l5)
+            block_lines = [l1, *islice(line_iterator, 4)]
+            if len(block_lines) < 5:
+                # truncated block at the end of the log, it is still being written
+                return
+            yield LogDetail.load_lines(*block_lines)
         l1 = next(line_iterator, None)
\ No newline at end of file
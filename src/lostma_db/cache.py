@@ -0,0 +1,100 @@
+from __future__ import annotations
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+"""
+Here is a small result cache for the requests of LostmaDB: the data only changes with a sync
+"""
+
+QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+READ_STATEMENTS = ["SELECT", "WITH", "FROM", "SHOW", "DESCRIBE", "SUMMARIZE"]
+
+
+@lru_cache(maxsize=1024)
+def normalize_query(query: str) -> str:
+    """
+    Collapse the whitespaces of a request, without touching its quoted literals and identifiers
+        (memoized: the generated requests of LostmaDB come back with the same text)
+    """
+    parts = QUOTED.split(query)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", parts[i])
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+@lru_cache(maxsize=1024)
+def is_read_query(query: str) -> bool:
+    """Check if a normalized request only reads the db"""
+    if re.match(r"COPY\b", query, re.IGNORECASE):
+        # COPY (request) TO and COPY table TO export the db, COPY table FROM writes in it
+        words = query[4:].lstrip().split(" ", 2)
+        return words[0].startswith("(") or (len(words) > 1 and words[1].upper() == "TO")
+    return query.split(" ", 1)[0].upper() in READ_STATEMENTS
+
+
+def is_dataframe(res) -> bool:
+    """Tell a pandas dataframe from an Arrow table, without importing pandas"""
+    return hasattr(res, "memory_usage")
+
+
+class ResultCache:
+    """
+    LRU cache of dataframes and Arrow tables, bounded by their size in memory
+        The generation counter is increased each time the cache is cleared
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries: OrderedDict[tuple, tuple[pd.DataFrame | pa.Table, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> pd.DataFrame | pa.Table | None:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                res = self._entries[key][0]
+                # a copy, so that the caller can modify its dataframe without corrupting the cache
+                # (Arrow tables are immutable)
+                return res.copy() if is_dataframe(res) else res
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, df: pd.DataFrame | pa.Table) -> None:
+        nbytes = int(df.memory_usage(deep=True).sum()) if is_dataframe(df) else df.nbytes
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (df.copy() if is_dataframe(df) else df, nbytes)
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                self._size -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.generation += 1
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max bytes": self.max_bytes,
+                "generation": self.generation,
+            }
@@ -1,13 +1,37 @@
+from __future__ import annotations
+import filecmp
+import shutil
 import subprocess
-import duckdb
-import pandas as pd
+import contextlib
+import contextvars
+import threading
+import time
+from datetime import datetime
+from math import nan
 from pathlib import Path
-from .general import def_requirements
-from .lostma_tables import LOSTMA_TABLES
+from typing import TYPE_CHECKING
+from .cache import ResultCache, normalize_query, is_read_query
+from .connection import ConnectionManager
+from .profiling import QueryProfiler, current_method, traced
+from .general import def_requirements, count_empty_expr, date_bounds_expr
+from .lostma_tables import (LOSTMA_TABLES, SCOPE_TABLE, DATE_INDEX_TABLE, INTERNAL_TABLES, WITNESS_PAGES,
+                            CORPUS_TABLES, TRADITION_EDGES, TRADITION_CLOSURE_TABLE, PARQUET_INDEXES)
+from .results import (BATCH_FORMATS, BATCH_SIZE, check_result_format, fetch_result, from_arrow,
+                      from_batch, from_records, to_arrow_reader, to_owned_reader)
+
+if TYPE_CHECKING:
+    import duckdb
+    import pandas as pd
+    from .graph import TraditionGraph
+
+# a failed or too long download of the CLI, tried again (see LostmaDB._download_attempts)
+DOWNLOAD_ERRORS = (subprocess.CalledProcessError, subprocess.TimeoutExpired)
 
 
 class LostmaDB:
-    def __init__(self, login, password, duckdb_path: str | Path | None = None):
+    def __init__(self, login, password, duckdb_path: str | Path | None = None,
+                 cache_bytes: int = 256 * 1024 * 1024, parquet_dir: str | Path | None = None,
+                 read_only: bool = False):
         self.database = "jbcamps_gestes"
         self.login = login
         self.password = password
@@ -15,29 +39,52 @@ class LostmaDB:
         base = Path.cwd()
         self.duckdb_path = Path(duckdb_path) if duckdb_path else base / "lostma.db"
         self.schema_dir = Path(self.database + "_schema")
-        self._con = None
+        # set by start_profiling
+        self.profiler = None
+        # read mode: the Parquet files of export_parquet, through views in a db in memory
+        self.parquet_dir = Path(parquet_dir).resolve() if parquet_dir else None
+        # one DuckDB instance shared by the threads (read_only: shared with other processes, no write)
+        if self.parquet_dir:
+            self._connections = ConnectionManager(None, on_open=self._parquet_views)
+        else:
+            self._connections = ConnectionManager(self.duckdb_path, read_only=read_only)
         self._requirements = None
+        # set cache_bytes to 0 to disable the cache of results
+        self._cache = ResultCache(cache_bytes)
+        # (fingerprint of the db, tradition graph), see tradition_graph
+        self._graph = None
+        # (fingerprint of the db, columns of each table, generated requests), see _get_catalog
+        self._catalog = None
+        # one sync at a time: they share their staging files
+        self._sync_lock = threading.Lock()
 
-    def download_database(self, type_arg: list = None) -> None:
+    def download_database(self, type_arg: list = None, duckdb_path: Path = None,
+                          timeout: float = None) -> None:
         """
         Use Heurist-API CLI to download the db
             heurist -d DB -l LOGIN -p PASSWORD download -f FILE.DB
         """
-        cmd = [
+        subprocess.run(self._download_command(type_arg, duckdb_path), check=True, timeout=timeout)
+
+    def _download_command(self, type_arg: list = None, duckdb_path: Path = None) -> list[str]:
+        return [
             self.cli_path,
             "-d", self.database,
             "-l", self.login,
             "-p", self.password,
             "download",
-            "-f", str(self.duckdb_path),
-              ] + type_arg
-        subprocess.run(cmd, check=True)
+            "-f", str(duckdb_path or self.duckdb_path),
+              ] + (type_arg or [])
 
-    def download_schema(self, type_arg: list = None) -> None:
+    def download_schema(self, type_arg: list = None, outdir: Path = None,
+                        timeout: float = None) -> None:
         """
         Use Heurist-API CLI to download the schema
             heurist -d DB -l LOGIN -p PASSWORD schema -t csv
         """
+        subprocess.run(self._schema_command(type_arg, outdir), check=True, timeout=timeout)
+
+    def _schema_command(self, type_arg: list = None, outdir: Path = None) -> list[str]:
         cmd = [
             self.cli_path,
             "-d", self.database,
@@ -45,58 +92,617 @@ class LostmaDB:
             "-p", self.password,
             "schema",
             "-t", "csv",
-        ] + type_arg
-        subprocess.run(cmd, check=True)
+        ] + (type_arg or [])
+        if outdir:
+            cmd += ["-o", str(outdir)]
+        return cmd
 
     def _close_connection(self):
-        if self._con is not None:
-            self._con.close()
-            self._con = None
+        with self._connections.lock.write():
+            self._connections.close()
+            self._cache.clear()
+
+    def _fingerprint(self) -> tuple:
+        """
+        Identify the current state of the db file (and of its write-ahead log)
+            In read mode, the state of the Parquet files: another export_parquet may write them again
+        """
+        stats = []
+        if self.parquet_dir:
+            paths = sorted(self.parquet_dir.rglob("*.parquet"))
+        else:
+            paths = [self.duckdb_path, self.duckdb_path.with_name(self.duckdb_path.name + ".wal")]
+        for path in paths:
+            if path.exists():
+                stat = path.stat()
+                stats.append((str(path), stat.st_mtime_ns, stat.st_size))
+        return self._cache.generation, tuple(stats)
+
+    def cache_info(self) -> dict:
+        """
+        Return the hits, misses and size of the cache of results
+        """
+        return self._cache.info()
 
     def _get_requirements(self, name_table: str):
         if self._requirements is None:
             self._requirements = def_requirements(self.schema_dir)
         return self._requirements.get(name_table, {})
 
+    def _get_catalog(self) -> tuple[dict[str, dict[str, str]], dict]:
+        """
+        Columns (and their types) of each table or view of the db, with the requests generated from them
+            Loaded in one request, again only when the db changes (a write, a sync, see _fingerprint)
+        """
+        key = self._fingerprint()
+        catalog = self._catalog
+        if catalog is None or catalog[0] != key:
+            tables = {}
+            for (table, column, dtype) in self._fetch(
+                    "SELECT table_name, column_name, data_type FROM information_schema.columns "
+                    "ORDER BY table_name, ordinal_position;"):
+                tables.setdefault(table, {})[column] = dtype
+            # the requests built on the former columns are dropped with them
+            catalog = self._catalog = (key, tables, {})
+        return catalog[1], catalog[2]
+
+    def _plan(self, key: tuple, build):
+        """
+        A generated request (and its metadata) is built once per state of the db, then reused as it is
+            so that its text, normalized and cached, does not change between two calls
+        """
+        plans = self._get_catalog()[1]
+        plan = plans.get(key)
+        if plan is None:
+            plan = plans[key] = build()
+        return plan
+
     def _get_columns(self, sql_name: str) -> list[str]:
-        rows = self.sql(
-            "SELECT column_name FROM information_schema.columns WHERE table_name = ?;",
-            [sql_name],
-            is_df=False,
-        ).fetchall()
-        return [r[0] for r in rows]
+        return list(self._get_catalog()[0].get(sql_name, {}))
 
-    def sync(self, type_table: str = None) -> None:
+    @traced
+    def sync(self, type_table: str | list[str] = None, incremental: bool = False,
+             max_workers: int = 4, timeout: float = None, retries: int = 1,
+             corpus_tables: bool = False) -> None:
         """
         Download the db and its schema
+            Each record type group (ex: ["My record types", "Bibliography"]), or the default groups of the CLI,
+            is downloaded concurrently in a staging file, again if it fails (retries), then merged in the db
+            In incremental mode, only the tables and schema files that changed are replaced
+            With corpus_tables, the corpus tables are also sliced by language (see build_corpus_tables)
         """
-        if type_table:
-            type_arg = ["-r", type_table]
+        self._check_db_file()
+        if isinstance(type_table, str):
+            type_table = [type_table]
+        with self._sync_lock:
+            # the reads go on against the current db during the downloads, they only wait for the swap
+            self._staged_download(type_table or [], incremental, max_workers, timeout, retries, corpus_tables)
+
+    def _check_db_file(self) -> None:
+        if self.parquet_dir:
+            raise RuntimeError(f"LostmaDB reads the Parquet files of {self.parquet_dir}: "
+                               "sync the db file, then export it again")
+
+    def _apply_staging(self, staging_dbs: list[Path], staging_schema: Path, incremental: bool,
+                       corpus_tables: bool) -> None:
+        """Swap in the staging files of a sync and build the indexes, the reads wait for the end"""
+        with self._connections.lock.write():
+            self._merge_staging(staging_dbs, staging_schema, incremental)
+            self._after_sync(corpus_tables)
+
+    def _after_sync(self, corpus_tables: bool) -> None:
+        """Forget what was computed on the former db, and build the indexes of the new one"""
+        self._cache.clear()
+        self._requirements = None
+        self._graph = None
+        self._catalog = None
+        self.build_scope_index()
+        self.build_date_index()
+        self.build_tradition_closure()
+        # the slices of a former sync would no longer match the db
+        if corpus_tables:
+            self.build_corpus_tables()
         else:
-            type_arg = []
-        self._close_connection()
-        self.download_database(type_arg)
-        self.download_schema(type_arg)
+            self.drop_corpus_tables()
+
+    def _staging_plan(self, groups: list[str]) -> tuple[list[list[str]], list[Path], Path]:
+        """
+        Arguments of the download of each record type group, with its staging file,
+            and staging directory of the schema
+            Without any group, a single download of the default groups of the CLI
+        """
+        group_args = [["-r", group] for group in groups] or [[]]
+        staging_dbs = [self.duckdb_path.with_name(f"{self.duckdb_path.stem}.staging-{i}.db")
+                       for i in range(len(group_args))]
+        staging_schema = self.schema_dir.with_name(self.schema_dir.name + ".staging")
+        return group_args, staging_dbs, staging_schema
+
+    @staticmethod
+    def _download_attempts(retries: int, label: str, report=print):
+        """
+        Attempts of a download, as context managers: a failed attempt is reported and the next one is made
+            for attempt in LostmaDB._download_attempts(retries, label):
+                with attempt:
+                    return download()
+        """
+        @contextlib.contextmanager
+        def attempt(last: bool):
+            try:
+                yield
+            except DOWNLOAD_ERRORS:
+                if last:
+                    raise
+                report(f"Download failed ({label or 'all groups'}), retrying...")
+
+        for i in range(retries + 1):
+            yield attempt(i == retries)
+
+    @staticmethod
+    def _clean_staging(staging_dbs: list[Path], staging_schema: Path) -> None:
+        for staging_db in staging_dbs:
+            for path in [staging_db, staging_db.with_name(staging_db.name + ".wal")]:
+                path.unlink(missing_ok=True)
+        shutil.rmtree(staging_schema, ignore_errors=True)
+
+    def _staged_download(self, groups: list[str], incremental: bool, max_workers: int, timeout: float,
+                         retries: int, corpus_tables: bool) -> None:
+        """
+        Download each record type group in its own staging file, then swap in the tables
+            No lock is held during the downloads, only during the swap (see _apply_staging)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        group_args, staging_dbs, staging_schema = self._staging_plan(groups)
+
+        def with_retry(download, *args):
+            for attempt in self._download_attempts(retries, " ".join(args[0])):
+                with attempt:
+                    return download(*args, timeout=timeout)
+
+        self._clean_staging(staging_dbs, staging_schema)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(with_retry, self.download_database, type_arg, staging_db)
+                           for (type_arg, staging_db) in zip(group_args, staging_dbs)]
+                futures.append(pool.submit(with_retry, self.download_schema,
+                                           [arg for type_arg in group_args for arg in type_arg],
+                                           staging_schema))
+                for future in futures:
+                    future.result()
+            self._apply_staging(staging_dbs, staging_schema, incremental, corpus_tables)
+        finally:
+            self._clean_staging(staging_dbs, staging_schema)
 
-    def sql(self, query: str, params: list = None, is_df : bool = True):
+    def _merge_staging(self, staging_dbs: list[Path], staging_schema: Path, incremental: bool) -> None:
+        """
+        Swap in the tables and the schema files of the staging files (the changed ones in incremental mode)
+            The reads wait for the end of the swap
+        """
+        with self._connections.write() as con:
+            catalog = con.execute("SELECT current_database();").fetchone()[0]
+            current = table_checksums(con, catalog) if incremental else {}
+            sources = {}
+            try:
+                for (i, staging_db) in enumerate(staging_dbs):
+                    con.execute(f"ATTACH '{sql_path(staging_db)}' AS staging_{i} (READ_ONLY);")
+                    downloaded = table_checksums(con, f"staging_{i}")
+                    for table in downloaded:
+                        # the base tables (rty, dty...) are in every file: the first one is kept
+                        if table not in sources and current.get(table) != downloaded[table]:
+                            sources[table] = f"staging_{i}"
+                # a single transaction, so that the db never mixes old and new tables
+                con.execute("BEGIN TRANSACTION;")
+                try:
+                    for (table, source) in sources.items():
+                        con.execute(f'CREATE OR REPLACE TABLE "{catalog}".main."{table}" AS '
+                                    f'FROM {source}.main."{table}";')
+                    con.execute("COMMIT;")
+                except Exception:
+                    con.execute("ROLLBACK;")
+                    raise
+            finally:
+                # the instance is shared: the staging files are not kept attached
+                for (i, _) in enumerate(staging_dbs):
+                    con.execute(f"DETACH DATABASE IF EXISTS staging_{i};")
+        self.schema_dir.mkdir(exist_ok=True)
+        for file in staging_schema.iterdir():
+            target = self.schema_dir / file.name
+            if not target.exists() or not filecmp.cmp(file, target, shallow=False):
+                # rename is atomic on the same filesystem
+                file.replace(target)
+        if incremental:
+            print(f"Tables updated: {', '.join(sources) if sources else 'none'}")
+
+    @traced
+    def build_scope_index(self) -> None:
+        """
+        Materialize the corpus scope of the db: one edge (table_name, H-ID, language)
+            for each record of a corpus table, following the joins up to TextTable
+        """
+        import duckdb
+        self.sql(
+            f"CREATE OR REPLACE TABLE {SCOPE_TABLE} "
+            "(table_name VARCHAR, \"H-ID\" BIGINT, language VARCHAR);",
+            is_df=False,
+        )
+        # the order of LOSTMA_TABLES matters: each scope is built from the previous ones
+        for name_table in LOSTMA_TABLES:
+            if not LOSTMA_TABLES[name_table].get("is_corpus_data"):
+                continue
+            try:
+                self.sql(
+                    f"INSERT INTO {SCOPE_TABLE} "
+                    f"SELECT DISTINCT ?, * FROM ({LOSTMA_TABLES[name_table]['scope_query']});",
+                    [LOSTMA_TABLES[name_table]["safe_sql_name"]],
+                    is_df=False,
+                )
+            except duckdb.CatalogException:
+                # a table of the join chain has not been downloaded
+                continue
+
+    @traced
+    def export_parquet(self, directory: str | Path, compression: str = "zstd") -> Path:
+        """
+        Write the tables of LOSTMA_TABLES in Parquet files, to share a snapshot of the db
+            The corpus tables are partitioned by language: <table>/corpus_language=<language>/*.parquet
+            (a record outside of any corpus is in the default partition), the others are <table>.parquet
+            The corpus scope, the date index and the tradition closure are written too
+            Read them with LostmaDB(..., parquet_dir=directory)
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        if not self._has_table(SCOPE_TABLE):
+            self.build_scope_index()
+        queries = LOSTMA_TABLES["parquet"]
+        sql_names = {table["safe_sql_name"]: table["is_corpus_data"]
+                     for table in LOSTMA_TABLES.values() if "safe_sql_name" in table}
+        sql_names.update(dict.fromkeys(PARQUET_INDEXES, False))
+        for (sql_name, is_corpus_data) in sql_names.items():
+            if not self._has_table(sql_name):
+                continue
+            partitions, file = directory / sql_name, directory / f"{sql_name}.parquet"
+            # an empty table gives no partition at all: it is written in a single file
+            if is_corpus_data and self._fetch(f"SELECT count(*) FROM {sql_name};", fetch="fetchone")[0]:
+                file.unlink(missing_ok=True)
+                self.sql(queries["corpus_export"].format(table=sql_name, path=sql_path(partitions),
+                                                         compression=compression), is_df=False)
+            else:
+                shutil.rmtree(partitions, ignore_errors=True)
+                self.sql(queries["export"].format(table=sql_name, path=sql_path(file), compression=compression),
+                         is_df=False)
+        return directory
+
+    def _parquet_views(self, con: duckdb.DuckDBPyConnection) -> None:
+        """Views of the tables on the Parquet files of export_parquet, in a new db in memory (read mode)"""
+        queries = LOSTMA_TABLES["parquet"]
+        sql_names = [table["safe_sql_name"] for table in LOSTMA_TABLES.values() if "safe_sql_name" in table]
+        for sql_name in sql_names + PARQUET_INDEXES:
+            partitions, file = self.parquet_dir / sql_name, self.parquet_dir / f"{sql_name}.parquet"
+            if sql_name in CORPUS_TABLES and any(partitions.glob("*/*.parquet")):
+                con.execute(queries["corpus_view"].format(corpus=CORPUS_TABLES[sql_name], path=sql_path(partitions)))
+                con.execute(queries["table_view"].format(table=sql_name, corpus=CORPUS_TABLES[sql_name]))
+            elif file.is_file():
+                con.execute(queries["view"].format(table=sql_name, path=sql_path(file)))
+
+    @traced
+    def build_tradition_closure(self) -> None:
+        """
+        Materialize the transitive closure of the tradition relations (see TRADITION_EDGES): one row
+            (ancestor_kind, ancestor_id, descendant_kind, descendant_id, depth) for each pair of records
+            linked by a path, ex: a text and the documents of its witnesses, sorted by ancestor
+        """
+        edges = []
+        for edge in TRADITION_EDGES:
+            if all(self._has_table(LOSTMA_TABLES[kind]["safe_sql_name"]) for kind in [edge["source"], edge["target"]]):
+                edges.append(f"SELECT '{edge['source']}' AS source_kind, source, "
+                             f"'{edge['target']}' AS target_kind, target FROM ({edge['query']})")
+        self.sql(
+            f"CREATE OR REPLACE TABLE {TRADITION_CLOSURE_TABLE} (ancestor_kind VARCHAR, ancestor_id BIGINT, "
+            "descendant_kind VARCHAR, descendant_id BIGINT, depth INTEGER);",
+            is_df=False,
+        )
+        if not edges:
+            return
+        # the relations go one way between kinds, without any cycle: a path has at most one edge of each
+        self.sql(
+            f"INSERT INTO {TRADITION_CLOSURE_TABLE} "
+            f"WITH RECURSIVE edges AS ({' UNION ALL '.join(edges)}), "
+            "closure AS ("
+            "SELECT source_kind AS ancestor_kind, source AS ancestor_id, target_kind AS descendant_kind, "
+            "target AS descendant_id, 1 AS depth FROM edges "
+            "UNION "
+            "SELECT closure.ancestor_kind, closure.ancestor_id, edges.target_kind, edges.target, closure.depth + 1 "
+            "FROM closure INNER JOIN edges "
+            "ON edges.source_kind = closure.descendant_kind AND edges.source = closure.descendant_id "
+            "WHERE closure.depth < ?) "
+            "SELECT ancestor_kind, ancestor_id, descendant_kind, descendant_id, min(depth) FROM closure "
+            "GROUP BY ALL ORDER BY ancestor_kind, ancestor_id, descendant_kind;",
+            [len(edges)],
+            is_df=False,
+        )
+
+    @traced
+    def tradition_graph(self) -> TraditionGraph:
+        """
+        Return the tradition graph of the db, in memory (see graph.py)
+            It is built once, then kept until the db changes (a sync...)
+        """
+        import duckdb
+        from .graph import TraditionGraph
+        key = self._fingerprint()
+        if self._graph is not None and self._graph[0] == key:
+            return self._graph[1]
+        kinds = dict.fromkeys(kind for edge in TRADITION_EDGES for kind in [edge["source"], edge["target"]])
+        nodes, edges, languages = {}, {}, None
+        for kind in kinds:
+            sql_name = LOSTMA_TABLES[kind]["safe_sql_name"]
+            if not self._has_table(sql_name):
+                continue
+            if kind == "text":
+                res = self._fetch(f"SELECT \"H-ID\", language_COLUMN FROM {sql_name} ORDER BY \"H-ID\";",
+                                  fetch="fetchnumpy")
+                languages = res["language_COLUMN"]
+            else:
+                res = self._fetch(f"SELECT \"H-ID\" FROM {sql_name} ORDER BY \"H-ID\";", fetch="fetchnumpy")
+            nodes[kind] = res["H-ID"]
+        for edge in TRADITION_EDGES:
+            if edge["source"] not in nodes or edge["target"] not in nodes:
+                continue
+            try:
+                res = self._fetch(edge["query"], fetch="fetchnumpy")
+            except duckdb.BinderException:
+                # a field of the relation is missing from the table
+                continue
+            edges[(edge["source"], edge["target"])] = (res["source"], res["target"])
+        graph = TraditionGraph(nodes, edges, languages)
+        self._graph = (key, graph)
+        return graph
+
+    @traced
+    def build_corpus_tables(self) -> None:
+        """
+        Materialize the slices by language of the corpus tables: one table corpus_<table> for each of them,
+            with the language of each record (from the corpus scope), sorted by language
+            The requests on some languages (texts, witnesses, tradition, analyse...) then only read their slice
+        """
+        import duckdb
+        if not self._has_table(SCOPE_TABLE):
+            self.build_scope_index()
+        for (sql_name, corpus) in CORPUS_TABLES.items():
+            try:
+                self.sql(LOSTMA_TABLES["corpus slices"]["create_query"].format(corpus=corpus, table=sql_name),
+                         is_df=False)
+            except duckdb.CatalogException:
+                # the table has not been downloaded: no slice, and no former one
+                self.sql(f"DROP TABLE IF EXISTS {corpus};", is_df=False)
+
+    @traced
+    def drop_corpus_tables(self) -> None:
+        """Drop the slices by language of the corpus tables: the requests read the whole tables again"""
+        for corpus in CORPUS_TABLES.values():
+            self.sql(f"DROP TABLE IF EXISTS {corpus};", is_df=False)
+
+    def _corpus_sources(self, sql_names: list[str], languages: list[str]) -> dict[str, str]:
+        """
+        Slices of some languages to read in place of the tables, if build_corpus_tables made all of them
+        """
+        corpus = [CORPUS_TABLES.get(sql_name) for sql_name in sql_names]
+        if not languages or None in corpus:
+            return {}
+        tables = self._get_catalog()[0]
+        if any(table not in tables for table in corpus):
+            return {}
+        template = "source" if len(languages) == 1 else "multi_source"
+        in_list = f"'{"', '".join(languages)}'"
+        return {sql_name: LOSTMA_TABLES["corpus slices"][template].format(corpus=table, table=sql_name,
+                                                                          languages=in_list)
+                for (sql_name, table) in zip(sql_names, corpus)}
+
+    @traced
+    def build_date_index(self) -> None:
+        """
+        Materialize the years of the Heurist dates of the db: one row (table_name, column_name, H-ID,
+            start_year, end_year) for each dated record, sorted so that a range of years only reads
+            the blocks it needs
+        """
+        columns = self._fetch(
+            "SELECT c.table_name, c.column_name FROM duckdb_columns AS c "
+            "WHERE c.database_name = current_database() AND c.schema_name = 'main' "
+            "AND c.data_type LIKE 'STRUCT(%estMinDate%' AND c.table_name NOT IN (SELECT UNNEST(?)) "
+            "AND EXISTS (SELECT 1 FROM duckdb_columns AS k WHERE k.database_name = c.database_name "
+            "AND k.schema_name = 'main' AND k.table_name = c.table_name AND k.column_name = 'H-ID') "
+            "ORDER BY c.table_name, c.column_name;",
+            [INTERNAL_TABLES],
+            fetch="fetchall",
+        )
+        selects = []
+        for (table, column) in columns:
+            start, end = date_bounds_expr(table, column)
+            selects.append(
+                f"SELECT '{table}' AS table_name, '{column}' AS column_name, \"{table}\".\"H-ID\", "
+                f"{start} AS start_year, {end} AS end_year FROM \"{table}\""
+            )
+        self.sql(
+            f"CREATE OR REPLACE TABLE {DATE_INDEX_TABLE} "
+            "(table_name VARCHAR, column_name VARCHAR, \"H-ID\" BIGINT, start_year INTEGER, end_year INTEGER);",
+            is_df=False,
+        )
+        if selects:
+            # the records without a start or an end year never fall in an interval
+            self.sql(
+                f"INSERT INTO {DATE_INDEX_TABLE} SELECT * FROM ({' UNION ALL '.join(selects)}) "
+                "WHERE start_year IS NOT NULL AND end_year IS NOT NULL "
+                "ORDER BY table_name, column_name, start_year;",
+                is_df=False,
+            )
+
+    @traced
+    def dated(self, base_table: str, attribute: str, year_min: int, year_max: int,
+              result_format: str = "pandas"):
+        """
+        Return the records of a table whose date attribute overlaps [year_min, year_max]
+            Same selection as interval(), as a range predicate on the date index
+        """
+        if not self._has_table(DATE_INDEX_TABLE):
+            self.build_date_index()
+        query = (f"SELECT * FROM {base_table} WHERE \"H-ID\" IN ("
+                 f"SELECT \"H-ID\" FROM {DATE_INDEX_TABLE} "
+                 "WHERE lower(table_name) = lower(?) AND column_name = ? "
+                 "AND end_year >= ? AND start_year <= ?);")
+        return self.sql(query, [base_table, attribute, year_min, year_max], result_format=result_format)
+
+    def _has_table(self, sql_name: str) -> bool:
+        # a table, or a view in read mode
+        return sql_name in self._get_catalog()[0]
+
+    @traced
+    def sql(self, query: str, params: list = None, is_df : bool = True,
+            result_format: str = "pandas"):
         """
         Execute a request and return a dataframe
+            result_format: "pandas" (default), "arrow", "reader" or "polars" (see results.py)
+            Results of read requests are cached until the db changes, the Arrow ones without any copy
+        """
+        check_result_format(result_format)
+        return self._execute(query, params, is_df, result_format)
+
+    def _fetch(self, query: str, params: list = None, fetch: str = "fetchall"):
+        """
+        Execute a request and fetch its rows ("fetchall", "fetchone", "fetchnumpy") while the db cannot change
+            (a result left on the cursor is lost if a sync closes the db in the meantime)
         """
-        if self._con is None:
-            self._con = duckdb.connect(self.duckdb_path)
-        res = self._con.execute(query, params)
-        if is_df:
-            res = res.fetchdf()
+        return self._execute(query, params, False, "pandas", fetch)
+
+    def _execute(self, query: str, params: list, is_df: bool, result_format: str, fetch: str = None):
+        if self.profiler is None:
+            return self._sql(query, params, is_df, result_format, fetch)[0]
+        started, start = time.time(), time.perf_counter()
+        res, cached = self._sql(query, params, is_df, result_format, fetch)
+        self.profiler.record(query, params, started, time.perf_counter() - start, res if is_df else None,
+                             cached, explain=lambda: self._explain(query, params))
         return res
 
-    def table(self, base_table: str, condition: str = None , joins: list[dict] = None):
+    def _sql(self, query: str, params: list, is_df: bool, result_format: str, fetch: str = None) -> tuple:
+        """Execute a request, return its result and whether it comes from the cache"""
+        normalized = normalize_query(query)
+        if not is_read_query(normalized):
+            # the request may modify the db: it waits for the reads in progress and runs alone
+            with self._connections.write() as cursor:
+                self._cache.clear()
+                res = cursor.execute(query, params)
+                if is_df:
+                    return fetch_result(res, result_format), False
+                return (getattr(res, fetch)() if fetch else res), False
+        if is_df and result_format == "reader":
+            # the reader is read after the request: a cursor of its own, so that the next requests
+            # of the thread do not replace its result (the cursor is closed once the reader is read)
+            with self._connections.new_cursor(close=False) as cursor:
+                return to_owned_reader(cursor.execute(query, params)), False
+        with self._connections.read() as cursor:
+            if is_df and self._cache.max_bytes:
+                # polars is built on the cached Arrow table
+                cache_format = "pandas" if result_format == "pandas" else "arrow"
+                key = (normalized, repr(params), cache_format, self._fingerprint())
+                res = self._cache.get(key)
+                cached = res is not None
+                if not cached:
+                    res = fetch_result(cursor.execute(query, params), cache_format)
+                    self._cache.put(key, res)
+                return (res if cache_format == result_format else from_arrow(res, result_format)), cached
+            res = cursor.execute(query, params)
+            if is_df:
+                res = fetch_result(res, result_format)
+            elif fetch:
+                res = getattr(res, fetch)()
+            return res, False
+
+    def _explain(self, query: str, params: list = None) -> str | None:
+        """Profile of a read request by EXPLAIN ANALYZE (the request runs again)"""
+        normalized = normalize_query(query)
+        # an export (COPY ... TO) is not written twice
+        if not is_read_query(normalized) or normalized[:4].upper() == "COPY":
+            return None
+        # a cursor of its own: the result of the request (is_df=False) stays on the cursor of the thread
+        with self._connections.new_cursor() as cursor:
+            rows = cursor.execute(f"EXPLAIN ANALYZE {query}", params).fetchall()
+        return "\n".join(row[-1] for row in rows)
+
+    def start_profiling(self, slow_threshold: float = None, max_records: int = 10_000) -> QueryProfiler:
         """
-        Return the content of a table
-            Filter on a condition and add joins if there are any
+        Record each request: wall time, rows, bytes, and the public method which sent it
+            The read requests slower than slow_threshold (in seconds) are profiled by EXPLAIN ANALYZE
+            See profiler.trace(), profiler.summary() and profiler.export("trace.json" or "trace.csv")
+        """
+        self.profiler = QueryProfiler(slow_threshold, max_records)
+        return self.profiler
+
+    def stop_profiling(self) -> QueryProfiler | None:
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
+    @traced
+    def run_many(self, queries: list[str | tuple[str, list]], max_workers: int = 4,
+                 result_format: str = "pandas") -> list:
         """
+        Execute independent requests concurrently, each on the cursor of its thread
+            A request is a string, or a tuple (request, params); the results keep the order of the requests
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        check_result_format(result_format)
+        queries = [(q, None) if isinstance(q, str) else q for q in queries]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # each request keeps the public method which sent it, for the profiling
+            futures = [pool.submit(contextvars.copy_context().run, self.sql, query, params,
+                                   result_format=result_format)
+                       for (query, params) in queries]
+            return [future.result() for future in futures]
+
+    @traced
+    def iter_sql(self, query: str, params: list = None, batch_size: int = BATCH_SIZE,
+                 result_format: str = "arrow"):
+        """
+        Yield the result of a read request by batches of batch_size rows
+            result_format: "arrow" (pyarrow.RecordBatch, default), "pandas" or "polars"
+            DuckDB streams the result: the memory stays bounded whatever the size of the db
+            The cursor is closed at the end, on error, or as soon as the caller stops iterating
+        """
+        if result_format not in BATCH_FORMATS:
+            raise ValueError(f"Unknown batch format {result_format!r}, choose among {BATCH_FORMATS}")
+        profiler = self.profiler
+        # the iteration may end outside of the public method which started it
+        method = current_method()
+        started, start = time.time(), time.perf_counter()
+        wall_time, rows, nbytes = 0.0, 0, 0
+        try:
+            # a cursor of its own, so that other requests can run between two batches
+            # (a sync waits for the end of the iteration)
+            with self._connections.new_cursor() as cursor:
+                reader = to_arrow_reader(cursor.execute(query, params), batch_size)
+                for batch in reader:
+                    rows += batch.num_rows
+                    nbytes += batch.nbytes
+                    # the time spent by the caller between two batches is not counted
+                    wall_time += time.perf_counter() - start
+                    start = None
+                    yield from_batch(batch, result_format)
+                    start = time.perf_counter()
+        finally:
+            if profiler is not None:
+                if start is not None:
+                    wall_time += time.perf_counter() - start
+                profiler.record(query, params, started, wall_time, size=(rows, nbytes), method=method)
+
+    def _table_query(self, base_table: str, condition: str = None , joins: list[dict] = None,
+                     source: str = None) -> str:
+        # source (and the "source" of a join) is read in place of the table, ex: its slice by language
+        return self._plan(("table", base_table, condition, repr(joins), source),
+                          lambda: self._build_table_query(base_table, condition, joins, source))
+
+    def _build_table_query(self, base_table: str, condition: str = None , joins: list[dict] = None,
+                           source: str = None) -> str:
         if joins:
             # build a specific select to avoid ambiguous column names on joined tables
-            join_tables = [j["table"] for j in (joins or [])]
+            # (the columns of a join with "is_selected": False are left out, ex: a link relation)
+            join_tables = [j["table"] for j in (joins or []) if j.get("is_selected", True)]
             all_tables = [base_table] + join_tables
             table_cols: dict[str, list[str]] = {}
             for t in all_tables:
@@ -115,16 +721,35 @@ class LostmaDB:
                     else:
                         select_expr.append(col_ref)
             select_clause = ",\n    ".join(select_expr)
-            query = f"SELECT\n    {select_clause}\nFROM {base_table} "
+            query = f"SELECT\n    {select_clause}\nFROM {source or base_table} "
             for join in joins:
-                query += " ".join(join.values())
+                query += " ".join([join["type_join"], join.get("source", join["table"]), join["on"]])
         else:
-            query = f"SELECT * FROM {base_table} "
+            query = f"SELECT * FROM {source or base_table} "
         if condition:
             query += condition
-        return self.sql(query)
+        return query
 
-    def texts(self, languages: list | str = None):
+    @traced
+    def table(self, base_table: str, condition: str = None , joins: list[dict] = None,
+              result_format: str = "pandas"):
+        """
+        Return the content of a table
+            Filter on a condition and add joins if there are any
+        """
+        return self.sql(self._table_query(base_table, condition, joins), result_format=result_format)
+
+    @traced
+    def iter_table(self, base_table: str, condition: str = None , joins: list[dict] = None,
+                   batch_size: int = BATCH_SIZE, result_format: str = "arrow"):
+        """
+        Yield the content of a table by batches of batch_size rows (see iter_sql)
+        """
+        yield from self.iter_sql(self._table_query(base_table, condition, joins),
+                                 batch_size=batch_size, result_format=result_format)
+
+    @traced
+    def texts(self, languages: list | str = None, result_format: str = "pandas"):
         """
         Return the content of the text table
             Filter on the language_COLUMN attribute (ex: 'dum (Middle Dutch)')
@@ -132,106 +757,125 @@ class LostmaDB:
         if languages:
             if isinstance(languages, str):
                 languages = [languages]
+            sources = self._corpus_sources(["TextTable"], languages)
+            if sources:
+                return self.sql(self._table_query("TextTable", source=sources["TextTable"]),
+                                result_format=result_format)
             condition = f"WHERE language_COLUMN IN ('{"', '".join(languages)}')"
-            return self.table("TextTable", condition)
-        return self.table("TextTable")
+            return self.table("TextTable", condition, result_format=result_format)
+        return self.table("TextTable", result_format=result_format)
 
-    def witnesses(self, languages: list | str = None):
+    @traced
+    def witnesses(self, languages: list | str = None, result_format: str = "pandas"):
         """
         Return the content of the witness table
             Filter on the language_COLUMN text attribute (ex: 'dum (Middle Dutch)')
         """
+        return self.sql(self._witnesses_query(languages), result_format=result_format)
+
+    @traced
+    def iter_witnesses(self, languages: list | str = None, batch_size: int = BATCH_SIZE,
+                       result_format: str = "arrow"):
+        """
+        Yield the content of the witness table by batches of batch_size rows (see iter_sql)
+        """
+        yield from self.iter_sql(self._witnesses_query(languages),
+                                 batch_size=batch_size, result_format=result_format)
+
+    def _witnesses_query(self, languages: list | str = None) -> str:
+        if isinstance(languages, str):
+            languages = [languages]
+        return self._plan(("witnesses", tuple(languages or [])), lambda: self._build_witnesses_query(languages))
+
+    def _build_witnesses_query(self, languages: list[str] = None) -> str:
+        sources = self._corpus_sources(["Witness", "TextTable", "Part", "DocumentTable"], languages)
+        if sources:
+            # every table of the join is read in its slice: no condition left on the language
+            return self._table_query("Witness", *self._witnesses_joins(sources=sources), source=sources["Witness"])
+        return self._table_query("Witness", *self._witnesses_joins(languages))
+
+    @staticmethod
+    def _witnesses_joins(languages: list | str = None, sources: dict[str, str] = None) -> tuple[str, list[dict]]:
         condition = ""
+        sources = sources or {}
+        witness_pages = WITNESS_PAGES.format(witness=sources.get("Witness", "Witness"),
+                                             part=sources.get("Part", "Part"))
         joins = [{"type_join": "LEFT JOIN", "table": "TextTable",
                   "on": "ON witness.\"is_manifestation_of H-ID\" = TextTable.\"H-ID\" "},
+                 # the pages are unnested into witness -> part edges: equality joins, no nested loop
+                 {"type_join": "LEFT JOIN", "table": witness_pages,
+                  "on": "ON witness_pages.witness_id = witness.\"H-ID\" ", "is_selected": False},
                  {"type_join": "LEFT JOIN", "table":  "Part",
-                  "on":  "ON list_contains(witness.\"observed_on_pages H-ID\", part.\"H-ID\") = TRUE "},
+                  "on":  "ON part.\"H-ID\" = witness_pages.part_id "},
                  {"type_join": "LEFT JOIN", "table":  "DocumentTable",
                   "on":  "ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\" "}]
+        for join in joins:
+            if join["table"] in sources:
+                join["source"] = sources[join["table"]]
         if languages:
             if isinstance(languages, str):
                 languages = [languages]
             condition = f"WHERE TextTable.language_COLUMN IN ('{"', '".join(languages)}')"
-        return self.table("Witness", condition, joins)
+        return condition, joins
 
     def is_table_exists(self, table_name: str, sql_name: str) -> None:
         """Check if table is available on the db, if not download it"""
-        row = self.sql(
-            "SELECT 1 FROM duckdb_tables WHERE table_name = ?;",
-            [sql_name],
-            is_df=False
-        ).fetchone()
-        if not row:
+        if not self._has_table(sql_name):
             type_table = LOSTMA_TABLES[table_name]["type"]
             print(f"Table {table_name} is not available. Downloading...")
             self.sync(type_table)
 
+    def _completeness_columns(self, sql_name: str) -> tuple[list[str], list[tuple[str, str]]]:
+        return self._plan(("completeness", sql_name), lambda: self._build_completeness_columns(sql_name))
+
+    def _build_completeness_columns(self, sql_name: str) -> tuple[list[str], list[tuple[str, str]]]:
+        """
+        Build the aggregate counting the empty records of each field with a requirement level
+        """
+        col_types = self._get_catalog()[0].get(sql_name, {})
+        columns = list(col_types.keys())
+        requirements = self._get_requirements(sql_name)
+        agg_expr = []
+        col_metadata = []
+        for column in columns:
+            if column in ["H-ID", "type_id"] or "TRM-ID" in column:
+                continue
+            req_type = requirements.get(column)
+            if req_type is None:
+                continue
+            agg_expr.append(count_empty_expr(sql_name, column, col_types[column]))
+            col_metadata.append((column, req_type))
+        return agg_expr, col_metadata
+
+    @traced
     def analyse(self, name_table: str = None,
-                language: str = None) -> dict | str:
+                language: str = None, result_format: str = "pandas") -> dict | str:
         """
         A function to analyse the completeness of each table for each corpus
+            The completeness table is given in result_format (see results.py)
         """
+        check_result_format(result_format)
         if name_table[0].isupper():
             name_table = name_table[0].lower() + name_table[1:]
         sql_name = LOSTMA_TABLES[name_table]["safe_sql_name"]
         self.is_table_exists(name_table, sql_name)
-        rows = self.sql(
-            "SELECT column_name, data_type "
-            "FROM information_schema.columns "
-            "WHERE table_name = ?;",
-            [sql_name],
-            is_df=False,
-        ).fetchall()
-        col_types = {name: dtype for (name, dtype) in rows}
-        columns = list(col_types.keys())
-        requirements = self._get_requirements(sql_name)
         action_required = "No field for this table"
-        if LOSTMA_TABLES[name_table]["is_corpus_data"]:
-            len_table = self.sql(LOSTMA_TABLES[name_table]["len_query"], [language], is_df=False).fetchone()[0]
-            if len_table and LOSTMA_TABLES[name_table]["action_required"]:
-                action_required = self.sql(LOSTMA_TABLES[name_table]["action_required"], [language],
-                                           is_df=False).fetchone()[0]
-        else:
-            len_table = self.sql(LOSTMA_TABLES["non-corpus tables"]["len_query"].format(table=sql_name),
-                                 is_df=False).fetchone()[0]
-            if len_table and LOSTMA_TABLES[name_table]["is_action_required"]:
-                action_required = self.sql(LOSTMA_TABLES["non-corpus tables"]["action_required"].format(table=sql_name),
-                                           is_df=False).fetchone()[0]
+        is_corpus_data = LOSTMA_TABLES[name_table]["is_corpus_data"]
+        if is_corpus_data and not self._has_table(SCOPE_TABLE):
+            self.build_scope_index()
+        # the slice of the language if build_corpus_tables made it, otherwise the table joined to the scope
+        sliced = bool(language and self._corpus_sources([sql_name], [language]))
+        queries = self._plan(("analyse", name_table, sliced), lambda: self._analyse_queries(name_table, sliced))
+        params = [language] if is_corpus_data else None
+        # requests go through the dataframe cache, the counts are converted back to int
+        len_table = int(self.sql(queries["len_query"], params).iat[0, 0])
+        if len_table and LOSTMA_TABLES[name_table]["is_action_required"]:
+            action_required = int(self.sql(queries["action_required"], params).iat[0, 0])
         if len_table:
-            agg_expr = []
-            col_metadata = []
-            for column in columns:
-                if column in ["H-ID", "type_id"] or "TRM-ID" in column:
-                    continue
-                req_type = requirements.get(column)
-                if req_type is None:
-                    continue
-                dtype = col_types[column]
-                if dtype.endswith('[]'):
-                    expr = f"""
-                    COUNT(*) FILTER (
-                      WHERE "{sql_name}"."{column}" IS NULL
-                         OR array_length("{sql_name}"."{column}") = 0
-                    ) AS "{column}"
-                    """
-                else:
-                    expr = f"""
-                    COUNT(*) FILTER (WHERE "{sql_name}"."{column}" IS NULL) AS "{column}"
-                    """
-                agg_expr.append(expr)
-                col_metadata.append((column, req_type))
-            agg_sql = ",\n".join(agg_expr)
-            if LOSTMA_TABLES[name_table]["is_corpus_data"]:
-                base_clause = LOSTMA_TABLES[name_table]["detail_query"].format(table=sql_name)
-                query = f"SELECT {agg_sql} {base_clause};"
-                params = [language]
-            else:
-                query = f"SELECT {agg_sql} FROM {sql_name};"
-                params = []
-            row = self.sql(query, params, is_df=False).fetchone()
+            row = self.sql(queries["detail_query"], params).iloc[0]
             list_empty = []
-            for (i, (column, req_type)) in enumerate(col_metadata):
-                count_empty = row[i]
+            for (i, (column, req_type)) in enumerate(queries["columns"]):
+                count_empty = int(row.iloc[i])
                 list_empty.append({
                     "field": column,
                     "required statement": req_type,
@@ -239,57 +883,185 @@ class LostmaDB:
                     "percentage empty": round((count_empty / len_table) * 100, 2),
                 })
             return {
-                "completeness table": pd.DataFrame(list_empty),
+                "completeness table": from_records(list_empty, result_format),
                 "total records": len_table,
                 "action required": action_required
             }
         else:
             return "No data"
 
-    def tradition(self, languages: list = None):
+    def _analyse_queries(self, name_table: str, sliced: bool) -> dict:
+        """
+        Requests of analyse on a table (its count, its records to review, its empty fields)
+            read from the slices of the corpus tables, or from the tables joined to the scope
+        """
+        sql_name = LOSTMA_TABLES[name_table]["safe_sql_name"]
+        if LOSTMA_TABLES[name_table]["is_corpus_data"]:
+            queries = LOSTMA_TABLES["corpus slices"] if sliced else LOSTMA_TABLES["corpus tables"]
+            corpus = CORPUS_TABLES.get(sql_name)
+            base_clause = queries["detail_query"].format(table=sql_name, corpus=corpus)
+        else:
+            queries = LOSTMA_TABLES["non-corpus tables"]
+            corpus = None
+            base_clause = f"FROM {sql_name}"
+        agg_expr, col_metadata = self._completeness_columns(sql_name)
+        return {
+            "len_query": queries["len_query"].format(table=sql_name, corpus=corpus),
+            "action_required": queries["action_required"].format(table=sql_name, corpus=corpus),
+            "detail_query": f"SELECT {",\n".join(agg_expr)} {base_clause};",
+            "columns": col_metadata,
+        }
+
+    @traced
+    def analyse_all(self, languages: list | str = None, result_format: str = "pandas"):
+        """
+        Analyse the completeness of every table for every corpus at once
+            One aggregate grouped by language per table, returned as a long-format dataframe
+            (non-corpus tables are not scoped by language, their language is left empty)
+        """
+        check_result_format(result_format)
+        if not self._has_table(SCOPE_TABLE):
+            self.build_scope_index()
+        if languages is None:
+            languages = [r[0] for r in self._fetch(
+                f"SELECT DISTINCT language FROM {SCOPE_TABLE} ORDER BY language;",
+                fetch="fetchall",
+            )]
+        elif isinstance(languages, str):
+            languages = [languages]
+        list_empty = []
+        for name_table in LOSTMA_TABLES:
+            if "safe_sql_name" not in LOSTMA_TABLES[name_table]:
+                continue
+            sql_name = LOSTMA_TABLES[name_table]["safe_sql_name"]
+            if not self._has_table(sql_name):
+                continue
+            sliced = bool(LOSTMA_TABLES[name_table]["is_corpus_data"] and self._corpus_sources([sql_name], languages))
+            query, col_metadata = self._plan(("analyse_all", name_table, sliced),
+                                             lambda: self._analyse_all_query(name_table, sliced))
+            params = [languages] if LOSTMA_TABLES[name_table]["is_corpus_data"] else []
+            rows = self._fetch(query, params, fetch="fetchall")
+            for (language, len_table, action_required, *counts) in rows:
+                if not len_table:
+                    continue
+                if action_required is None:
+                    action_required = "No field for this table"
+                for ((column, req_type), count_empty) in zip(col_metadata, counts):
+                    list_empty.append({
+                        "table": name_table,
+                        "language": language,
+                        "field": column,
+                        "required statement": req_type,
+                        "empty records": count_empty,
+                        "percentage empty": round((count_empty / len_table) * 100, 2),
+                        "total records": len_table,
+                        "action required": action_required,
+                    })
+        return from_records(list_empty, result_format)
+
+    def _analyse_all_query(self, name_table: str, sliced: bool) -> tuple[str, list[tuple[str, str]]]:
+        """
+        Aggregate of analyse_all on a table, grouped by language: count, records to review, empty fields
+        """
+        sql_name = LOSTMA_TABLES[name_table]["safe_sql_name"]
+        agg_expr, col_metadata = self._completeness_columns(sql_name)
+        if LOSTMA_TABLES[name_table]["is_corpus_data"]:
+            if sliced:
+                select_expr = [f"{sql_name}.corpus_language", "count(*)"]
+                queries = LOSTMA_TABLES["corpus slices"]
+            else:
+                select_expr = ["scope.language", "count(*)"]
+                queries = LOSTMA_TABLES["corpus tables"]
+            if LOSTMA_TABLES[name_table]["is_action_required"]:
+                select_expr.append(f"count(*) FILTER (WHERE {sql_name}.review_status = 'Action required')")
+            base_clause = queries["group_query"].format(table=sql_name, corpus=CORPUS_TABLES[sql_name])
+        else:
+            select_expr = ["NULL", f"count(DISTINCT {sql_name}.\"H-ID\")"]
+            if LOSTMA_TABLES[name_table]["is_action_required"]:
+                select_expr.append(f"count(DISTINCT {sql_name}.\"H-ID\") "
+                                   f"FILTER (WHERE {sql_name}.review_status = 'Action required')")
+            base_clause = LOSTMA_TABLES["non-corpus tables"]["group_query"].format(table=sql_name)
+        if not LOSTMA_TABLES[name_table]["is_action_required"]:
+            select_expr.append("NULL")
+        select_sql = ",\n".join(select_expr + agg_expr)
+        return f"SELECT {select_sql} {base_clause}", col_metadata
+
+    @traced
+    def tradition(self, languages: list = None, result_format: str = "pandas"):
         """
             Return the data necessary to study the tradition of manuscripts
         """
-        query = ("SELECT witness.\"H-ID\" AS witness_id, TextTable.\"H-ID\" AS text_id FROM witness "
-                 "INNER JOIN TextTable ON witness.\"is_manifestation_of H-ID\" = TextTable.\"H-ID\" ")
-        if languages:
-            if isinstance(languages, str):
-                languages = [languages]
+        if isinstance(languages, str):
+            languages = [languages]
+        sources = self._corpus_sources(["Witness", "TextTable"], languages)
+        query = ("SELECT witness.\"H-ID\" AS witness_id, TextTable.\"H-ID\" AS text_id "
+                 f"FROM {sources.get('Witness', 'witness')} "
+                 f"INNER JOIN {sources.get('TextTable', 'TextTable')} "
+                 "ON witness.\"is_manifestation_of H-ID\" = TextTable.\"H-ID\" ")
+        if languages and not sources:
             query += f"WHERE TextTable.language_COLUMN IN ('{"', '".join(languages)}')"
-        return self.sql(query)
+        return self.sql(query, result_format=result_format)
+
+
+def sql_path(path: Path) -> str:
+    """A path in a SQL string"""
+    return str(path).replace("'", "''")
+
+
+def table_checksums(con: duckdb.DuckDBPyConnection, catalog: str) -> dict:
+    """
+    Summarize each table of a db with its columns, its number of rows and a checksum of its rows
+    """
+    tables = con.execute(
+        "SELECT table_name FROM duckdb_tables WHERE database_name = ? AND schema_name = 'main';",
+        [catalog],
+    ).fetchall()
+    checksums = {}
+    for (table,) in tables:
+        columns = con.execute(
+            "SELECT list(column_name || ' ' || data_type ORDER BY column_index) "
+            "FROM duckdb_columns WHERE database_name = ? AND schema_name = 'main' AND table_name = ?;",
+            [catalog, table],
+        ).fetchone()[0]
+        # sum of the row hashes: does not depend on the order of the rows
+        count, checksum = con.execute(
+            f'SELECT count(*), sum(hash(t)) FROM "{catalog}".main."{table}" AS t;'
+        ).fetchone()
+        checksums[table] = (tuple(columns), count, checksum)
+    return checksums
 
 
 def interval(table: pd.DataFrame, attribute: str, year_min: int, year_max: int) -> pd.DataFrame:
     """
     A filter that extracts data from a specific time interval
+        The years are read in one pass over the dates, then compared as numpy arrays
+        (LostmaDB.dated() does the same selection in the db, on the date index)
     """
-    if isinstance(year_min, str):
-        year_min = str(year_min)
-    if isinstance(year_max, str):
-        year_max = str(year_max)
+    import numpy as np
+    year_min = float(year_min)
+    year_max = float(year_max)
 
-    def extract_interval(d):
+    def extract_year(date) -> float:
+        # the year is read before the first "-": datetime, Timestamp or text
+        if isinstance(date, datetime):
+            return date.year
+        try:
+            return float(str(date).split("-", 1)[0])
+        except ValueError:
+            return nan
+
+    def extract_interval(d) -> tuple[float, float]:
         if not isinstance(d, dict):
-            return pd.NaT, pd.NaT
+            return nan, nan
         if "value" in d and d["value"]:
-            return d["value"], d["value"]
+            year = extract_year(d["value"])
+            return year, year
         start = d.get("estMinDate")
         end = d.get("estMaxDate")
         if not start and not end:
-            return pd.NaT, pd.NaT
-        return start, end
-
-    intervals = table[attribute].apply(extract_interval)
-    intervals = pd.DataFrame(intervals.tolist(), index=table.index, columns=["start", "end"])
-    intervals["start"] = (
-        intervals["start"].astype(str)
-        .str.split("-", n=1).str[0]
-    )
-    intervals["start"] = pd.to_numeric(intervals["start"], errors="coerce")
-    intervals["end"] = (
-        intervals["end"].astype(str)
-        .str.split("-", n=1).str[0]
-    )
-    intervals["end"] = pd.to_numeric(intervals["end"], errors="coerce")
-    mask = (intervals["end"] >= year_min) & (intervals["start"] <= year_max)
-    return table[mask]
\ No newline at end of file
+            return nan, nan
+        return extract_year(start), extract_year(end)
+
+    intervals = np.array([extract_interval(d) for d in table[attribute]], dtype=float).reshape(-1, 2)
+    mask = (intervals[:, 1] >= year_min) & (intervals[:, 0] <= year_max)
+    return table[mask]
@@ -0,0 +1,149 @@
+from __future__ import annotations
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import duckdb
+
+"""
+Here are the connections of LostmaDB to its db file, shared between threads
+    One DuckDB instance for the process, one cursor for each thread
+    The reads run together, a write (a sync, a CREATE...) waits for them and runs alone
+"""
+
+
+class RWLock:
+    """
+    Reader/writer lock: many readers or one writer
+        A waiting writer goes before the new readers, so that a sync is not delayed forever
+        The writing thread can read, and write again, without blocking itself
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        depth = getattr(self._local, "reads", 0)
+        with self._cond:
+            # a thread already reading goes on, even with a writer waiting: otherwise it would wait for itself
+            if self._writer != threading.get_ident() and not depth:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers += 1
+        self._local.reads = depth + 1
+        try:
+            yield
+        finally:
+            self._local.reads = depth
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                if getattr(self._local, "reads", 0):
+                    raise RuntimeError("This thread is reading the db (ex: iter_sql), it cannot write in it")
+                self._waiting_writers += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._waiting_writers -= 1
+                self._writer = me
+            self._write_depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._write_depth -= 1
+                if not self._write_depth:
+                    self._writer = None
+                self._cond.notify_all()
+
+
+class ConnectionManager:
+    """
+    DuckDB instance of a db file, handing out one cursor per thread
+        The file is opened with the default configuration of DuckDB: the other connections of the process
+        to the same file (ex: the reports of analyse.py, another LostmaDB) share the instance
+        read_only: the file is opened read-only, ex: by several processes at once (the writes fail)
+        Without any path, the db is in memory: on_open prepares each new instance (ex: views on files)
+    """
+    def __init__(self, path: Path | str | None, on_open=None, read_only: bool = False):
+        self.path = Path(path) if path is not None else None
+        self.on_open = on_open
+        self.read_only = read_only
+        self.lock = RWLock()
+        self._con = None
+        # increased each time the instance is replaced: the cursors of the former one are dropped
+        self._generation = 0
+        self._mutex = threading.Lock()
+        self._local = threading.local()
+
+    def _open(self) -> None:
+        import duckdb
+        # a DuckDB instance refuses a connection to its file with another configuration than its own
+        self._con = duckdb.connect(self.path if self.path is not None else ":memory:", read_only=self.read_only)
+        self._generation += 1
+        if self.on_open is not None:
+            self.on_open(self._con)
+
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        with self._mutex:
+            if self._con is None:
+                self._open()
+            generation = self._generation
+            con = self._con
+        cached = getattr(self._local, "cursor", None)
+        if cached is None or cached[0] != generation:
+            cached = (generation, con.cursor())
+            self._local.cursor = cached
+        return cached[1]
+
+    @contextmanager
+    def read(self):
+        """Cursor of the current thread, to read the db"""
+        with self.lock.read():
+            yield self._cursor()
+
+    @contextmanager
+    def new_cursor(self, close: bool = True):
+        """
+        A cursor of its own, to read the db (ex: a stream of batches), closed at the end
+            With close=False, it is left to the caller: ex: a result read after the end of the block
+        """
+        with self.lock.read():
+            with self._mutex:
+                if self._con is None:
+                    self._open()
+                cursor = self._con.cursor()
+            try:
+                yield cursor
+            except BaseException:
+                cursor.close()
+                raise
+            if close:
+                cursor.close()
+
+    @contextmanager
+    def write(self):
+        """Cursor of the current thread, to write in the db once the reads are over"""
+        with self.lock.write():
+            yield self._cursor()
+
+    def close(self) -> None:
+        with self._mutex:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+                self._generation += 1
@@ -1,15 +1,139 @@
 from pathlib import Path
+from dataclasses import dataclass
+from functools import lru_cache
 import ast
 import csv
-import duckdb
+import hashlib
+import os
+import pickle
 
-KEYWORDS = [t[0] for t in duckdb.sql("select * from duckdb_keywords()").fetchall()]
 REQ_TYPES = ["optional", "recommended", "required", "hidden"]
+# the compiled schemas are cached in the cache directory of the user ($XDG_CACHE_HOME or ~/.cache),
+# out of the schema directory (the CLI owns it) and of the working directory
+SCHEMA_CACHE_DIR = "lostma_db"
+SCHEMA_CACHE = "{schema}-{digest}.pickle"
+SCHEMA_CACHE_VERSION = 2
+# compiled schemas of this process: path -> (key, model)
+_COMPILED = {}
 
 """
 Here is a first version, ready for use, for a Heurist schema reader
 """
 
+@lru_cache(maxsize=None)
+def keywords() -> frozenset[str]:
+    """
+    Keywords of DuckDB, asked to DuckDB the first time they are needed and not at import
+    """
+    import duckdb
+    return frozenset(t[0] for t in duckdb.sql("select * from duckdb_keywords()").fetchall())
+
+
+def __getattr__(name: str):
+    # KEYWORDS is kept for the former imports, computed on first access
+    if name == "KEYWORDS":
+        return keywords()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@dataclass
+class SchemaField:
+    requirement: str
+    field_type: str
+    pointer_targets: list[int]
+    vocab_terms: list[str]
+
+
+def column_name(row: dict) -> str:
+    """
+    Give the name of the column of a field in the DuckDB
+    """
+    # Il faut nettoyer 2-3 trucs issus de la table Stemma...
+    # En fait il faudrait que le schéma soit rédigé avec les mêmes transfo que les tables de la DuckDB
+    name_detail = row['rst_DisplayName']
+    if "-" in name_detail:
+        name_detail = name_detail.replace("-", " ")
+    if name_detail == "URL(s)":
+        name_detail = "URL"
+    # Si c'est une clé étrangère, il me faut ajouter un H-ID
+    foreign_key = ast.literal_eval(row['dty_PtrTargetRectypeIDs'])
+    if foreign_key:
+        name_detail += " H-ID"
+    # Je reprends ici des trucs présent dans le fichier sql_safety de l'Heurist-API
+    if name_detail.lower() in keywords():
+        name_detail = f"{name_detail}_COLUMN"
+    return name_detail
+
+
+def compile_schema(path: Path | str) -> dict[str, dict[str, SchemaField]]:
+    """
+    Parse the CSV files of the schema once: tables -> fields -> requirement, pointer targets, vocabulary
+        The result is kept in a binary cache, used as long as the CSV files do not change
+    """
+    import duckdb
+    path = Path(path).resolve()
+    files = sorted(file for file in path.iterdir() if file.suffix == ".csv")
+    # the names of the columns depend on the keywords of the DuckDB version (see column_name)
+    key = (SCHEMA_CACHE_VERSION, duckdb.__version__,
+           [(file.name, file.stat().st_mtime_ns, file.stat().st_size) for file in files])
+    if _COMPILED.get(path, (None,))[0] == key:
+        return _COMPILED[path][1]
+    cache = schema_cache(path)
+    if cache.is_file():
+        try:
+            with open(cache, "rb") as f:
+                cached_key, model = pickle.load(f)
+            if cached_key == key:
+                _COMPILED[path] = (key, model)
+                return model
+        except Exception:
+            # a cache which cannot be read (truncated, from another version...) is built again
+            pass
+    model = {}
+    for file in files:
+        file_name = file.name.split(".")[0]
+        model[file_name] = {}
+        with open(file, 'r') as csv_file:
+            reader = csv.DictReader(csv_file, delimiter=',')
+            for row in reader:
+                # J'enlève les éléments du Header
+                if "Header" in row['dty_Name']:
+                    continue
+                vocab_terms = []
+                if row['dty_Type'] == "enum":
+                    vocab_terms = [t.split("={")[0].replace("{", "").replace("\'", "").replace("\\\\\\", "\'")
+                                   for t in row['vocabTerms'].split("}, ")]
+                model[file_name][column_name(row)] = SchemaField(
+                    requirement=row['rst_RequirementType'],
+                    field_type=row['dty_Type'],
+                    pointer_targets=list(ast.literal_eval(row['dty_PtrTargetRectypeIDs']) or []),
+                    vocab_terms=vocab_terms,
+                )
+    try:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        tmp_cache = cache.with_name(cache.name + ".tmp")
+        with open(tmp_cache, "wb") as f:
+            pickle.dump((key, model), f)
+        tmp_cache.replace(cache)
+        # the former caches, inside the schema directory and next to it
+        (path / ".schema.pickle").unlink(missing_ok=True)
+        path.with_name(f".{path.name}.pickle").unlink(missing_ok=True)
+    except OSError:
+        # read-only directory: the model is only kept in memory
+        pass
+    _COMPILED[path] = (key, model)
+    return model
+
+
+def schema_cache(path: Path) -> Path:
+    """
+    Cache file of a schema directory, ex: ~/.cache/lostma_db/jbcamps_gestes_schema-<hash>.pickle
+    """
+    root = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    digest = hashlib.sha1(str(path).encode()).hexdigest()[:16]
+    return root / SCHEMA_CACHE_DIR / SCHEMA_CACHE.format(schema=path.name, digest=digest)
+
+
 def def_requirements(
         path: Path | str,
         req_types: list[str] | str = None
@@ -19,32 +143,43 @@ def def_requirements(
     """
     if req_types is None:
         req_types = REQ_TYPES
-    data = {}
     if not isinstance(req_types, list):
         req_types = [req_types]
-    for file in path.iterdir():
-        file_name = file.name.split(".")[0]
-        data[file_name] = {}
-        with open(file, 'r') as csv_file:
-            reader = csv.DictReader(csv_file, delimiter=',')
-            for row in reader:
-                # Il faut nettoyer 2-3 trucs issus de la table Stemma...
-                # En fait il faudrait que le schéma soit rédigé avec les mêmes transfo que les tables de la DuckDB
-                name_detail = row['rst_DisplayName']
-                if "-" in name_detail:
-                    name_detail = name_detail.replace("-", " ")
-                if name_detail == "URL(s)":
-                    name_detail = "URL"
-                # Si c'est une clé étrangère, il me faut ajouter un H-ID
-                foreign_key = ast.literal_eval(row['dty_PtrTargetRectypeIDs'])
-                if foreign_key:
-                    name_detail += " H-ID"
-                # Je reprends ici des trucs présent dans le fichier sql_safety de l'Heurist-API
-                if name_detail.lower() in KEYWORDS:
-                    name_detail = f"{name_detail}_COLUMN"
-                # J'enlève les éléments du Header
-                if "Header" not in row['dty_Name']:
-                    for t in req_types:
-                        if row['rst_RequirementType'] == t:
-                            data[file_name][name_detail] = t
-    return data
\ No newline at end of file
+    data = {}
+    for (file_name, fields) in compile_schema(path).items():
+        data[file_name] = {name: field.requirement for (name, field) in fields.items()
+                           if field.requirement in req_types}
+    return data
+
+
+def count_empty_expr(table: str, column: str, dtype: str) -> str:
+    """
+    Aggregate counting the empty records of a column: NULL, or an empty array for list columns
+    """
+    if dtype.endswith('[]'):
+        return f"""
+        COUNT(*) FILTER (
+          WHERE "{table}"."{column}" IS NULL
+             OR array_length("{table}"."{column}") = 0
+        ) AS "{column}"
+        """
+    return f"""
+        COUNT(*) FILTER (WHERE "{table}"."{column}" IS NULL) AS "{column}"
+        """
+
+
+def date_bounds_expr(table: str, column: str) -> tuple[str, str]:
+    """
+    Start and end years of a Heurist date column (struct of value, estMinDate, estMaxDate)
+        The year of the value if there is one, else the years of the estimated dates
+    """
+    def field(name: str) -> str:
+        return f"NULLIF(CAST(\"{table}\".\"{column}\".\"{name}\" AS VARCHAR), '')"
+
+    def year(name: str) -> str:
+        # the year is read before the first "-", like interval() does on the dataframes
+        return f"TRY_CAST(split_part({field(name)}, '-', 1) AS INTEGER)"
+
+    start = f"CASE WHEN {field('value')} IS NOT NULL THEN {year('value')} ELSE {year('estMinDate')} END"
+    end = f"CASE WHEN {field('value')} IS NOT NULL THEN {year('value')} ELSE {year('estMaxDate')} END"
+    return start, end
@@ -0,0 +1,173 @@
+from __future__ import annotations
+from collections import deque
+import numpy as np
+
+"""
+Here is the tradition graph of the db, in memory (see LostmaDB.tradition_graph)
+    text -> witness -> part -> document, and text -> stemma
+    The records of each kind are numbered in the order of their H-ID
+    Each relation is a compressed adjacency (CSR): the targets of the record i are
+    targets[offsets[i]:offsets[i + 1]], so that a walk or a degree is a few numpy operations
+"""
+
+
+class Adjacency:
+    """
+    Compressed sparse rows of a relation: offsets (one more than the sources) and targets (int32 indices)
+    """
+    def __init__(self, offsets: np.ndarray, targets: np.ndarray):
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_edges(cls, sources: np.ndarray, targets: np.ndarray, n_sources: int) -> Adjacency:
+        order = np.argsort(sources, kind="stable")
+        offsets = np.zeros(n_sources + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n_sources), out=offsets[1:])
+        return cls(offsets, targets[order].astype(np.int32))
+
+    def transpose(self, n_targets: int) -> Adjacency:
+        """The reverse relation (ex: document -> part)"""
+        sources = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), self.degrees())
+        return Adjacency.from_edges(self.targets, sources, n_targets)
+
+    def degrees(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def neighbours(self, nodes: np.ndarray) -> np.ndarray:
+        """Targets of some sources, each one once"""
+        starts = self.offsets[nodes]
+        lengths = self.offsets[nodes + 1] - starts
+        # position of each target: start of its source + its rank among the targets of this source
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.unique(self.targets[positions])
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+
+class TraditionGraph:
+    """
+    Records of the tradition, by kind, and their relations in both directions
+        nodes: sorted H-IDs of each kind (text, witness...)
+        edges: (source kind, target kind) -> (H-IDs of the sources, H-IDs of the targets)
+        languages: language of each text, in the order of nodes["text"]
+    """
+    def __init__(self, nodes: dict[str, np.ndarray], edges: dict[tuple[str, str], tuple[np.ndarray, np.ndarray]],
+                 languages: np.ndarray = None):
+        self.nodes = {kind: np.sort(np.asarray(ids, dtype=np.int64)) for (kind, ids) in nodes.items()}
+        if languages is None:
+            languages = np.full(len(self.nodes.get("text", [])), None)
+        # a text without language is None (DuckDB gives a masked array)
+        languages = np.ma.asarray(languages, dtype=object)
+        self.languages = np.where(np.ma.getmaskarray(languages), None, languages.data)
+        self.relations: dict[tuple[str, str], Adjacency] = {}
+        self._forward = []
+        for ((source, target), (source_ids, target_ids)) in edges.items():
+            if source not in self.nodes or target not in self.nodes:
+                continue
+            sources, targets = self.index(source, source_ids), self.index(target, target_ids)
+            # an edge to a record missing from the db is left out
+            kept = (sources >= 0) & (targets >= 0)
+            adjacency = Adjacency.from_edges(sources[kept], targets[kept], len(self.nodes[source]))
+            self.relations[(source, target)] = adjacency
+            self.relations[(target, source)] = adjacency.transpose(len(self.nodes[target]))
+            self._forward.append((source, target))
+
+    def __repr__(self) -> str:
+        nodes = ", ".join(f"{len(ids)} {kind}" for (kind, ids) in self.nodes.items())
+        edges = ", ".join(f"{len(self.relations[key])} {key[0]} -> {key[1]}" for key in self._forward)
+        return f"TraditionGraph({nodes}; {edges})"
+
+    def index(self, kind: str, ids) -> np.ndarray:
+        """Indices of some H-IDs among the records of a kind (-1 for an unknown H-ID)"""
+        nodes = self.nodes[kind]
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        if not len(nodes):
+            return np.full(len(ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(nodes, ids), len(nodes) - 1)
+        return np.where(nodes[positions] == ids, positions, -1)
+
+    def _path(self, source: str, target: str) -> list[str]:
+        """Shortest chain of relations between two kinds (ex: document, part, witness, text)"""
+        previous = {source: None}
+        queue = deque([source])
+        while queue:
+            kind = queue.popleft()
+            if kind == target:
+                path = [kind]
+                while previous[path[-1]] is not None:
+                    path.append(previous[path[-1]])
+                return path[::-1]
+            for (a, b) in self.relations:
+                if a == kind and b not in previous:
+                    previous[b] = kind
+                    queue.append(b)
+        raise ValueError(f"No relation between {source!r} and {target!r} in the graph")
+
+    def reach(self, kind: str, ids, target: str) -> np.ndarray:
+        """
+        H-IDs of the records of the target kind linked to some records (ex: the documents of some texts)
+        """
+        nodes = self.index(kind, ids)
+        nodes = np.unique(nodes[nodes >= 0])
+        path = self._path(kind, target)
+        for (a, b) in zip(path, path[1:]):
+            nodes = self.relations[(a, b)].neighbours(nodes)
+        return self.nodes[target][nodes]
+
+    def texts(self, languages: list | str) -> np.ndarray:
+        """H-IDs of the texts in some languages (ex: 'dum (Middle Dutch)')"""
+        if isinstance(languages, str):
+            languages = [languages]
+        return self.nodes["text"][np.isin(self.languages, languages)]
+
+    def corpus(self, kind: str, languages: list | str) -> np.ndarray:
+        """
+        H-IDs of the records of a kind carrying texts in some languages (ex: the documents of a corpus)
+        """
+        texts = self.texts(languages)
+        return texts if kind == "text" else self.reach("text", texts, kind)
+
+    def degrees(self, source: str, target: str) -> np.ndarray:
+        """Number of targets of each record of the source kind (ex: witness, part: pages of each witness)"""
+        return self.relations[(source, target)].degrees()
+
+    def degree_distribution(self, source: str, target: str) -> dict[int, int]:
+        """Number of records of the source kind for each degree"""
+        counts = np.bincount(self.degrees(source, target))
+        return {degree: int(count) for (degree, count) in enumerate(counts) if count}
+
+    def components(self) -> dict[str, np.ndarray]:
+        """
+        Connected components of the graph: a label for each record of each kind, numbered from 0
+            (ex: the texts sharing a witness, the witnesses sharing a document...)
+            A record without any relation has a component of its own
+        """
+        kinds = list(self.nodes)
+        starts = dict(zip(kinds, np.cumsum([0] + [len(self.nodes[kind]) for kind in kinds[:-1]])))
+        n = sum(len(ids) for ids in self.nodes.values())
+        sources, targets = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        for (source, target) in self._forward:
+            adjacency = self.relations[(source, target)]
+            sources.append(starts[source] + np.repeat(np.arange(len(self.nodes[source])), adjacency.degrees()))
+            targets.append(starts[target] + adjacency.targets.astype(np.int64))
+        sources, targets = np.concatenate(sources), np.concatenate(targets)
+        # each record points to the smallest record of its tree: the roots of both ends of an edge
+        # are hooked to the smaller one, then the pointers jump to the roots, until no edge joins two trees
+        labels = np.arange(n)
+        while True:
+            low = np.minimum(labels[sources], labels[targets])
+            hooked = labels.copy()
+            np.minimum.at(hooked, labels[sources], low)
+            np.minimum.at(hooked, labels[targets], low)
+            while True:
+                jumped = hooked[hooked]
+                if np.array_equal(jumped, hooked):
+                    break
+                hooked = jumped
+            if np.array_equal(hooked, labels):
+                break
+            labels = hooked
+        labels = np.unique(labels, return_inverse=True)[1]
+        return {kind: labels[starts[kind]:starts[kind] + len(self.nodes[kind])] for kind in kinds}
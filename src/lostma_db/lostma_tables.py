@@ -1,141 +1,97 @@
+SCOPE_TABLE = "corpus_scope"
+LOG_TABLE = "validation_log"
+LOG_STATE_TABLE = "validation_log_state"
+DATE_INDEX_TABLE = "date_index"
+INTERNAL_TABLES = [SCOPE_TABLE, LOG_TABLE, LOG_STATE_TABLE, DATE_INDEX_TABLE]
+# slice of a corpus table by language: its records with their language, sorted by language
+# (the blocks of the other languages are skipped on their min/max), see LostmaDB.build_corpus_tables
+CORPUS_TABLE = "corpus_{table}"
+CORPUS_LANGUAGE = "corpus_language"
+# edges witness -> part of the pages observed, to join Part on equality instead of list_contains
+# (a page listed twice gives one edge, a page missing from Part gives none)
+# {witness} and {part} are the tables, or their slices by language
+WITNESS_PAGES = """(
+    SELECT DISTINCT pages.witness_id, part."H-ID" AS part_id
+    FROM (SELECT "H-ID" AS witness_id, UNNEST("observed_on_pages H-ID") AS page FROM {witness}) AS pages
+    INNER JOIN {part} ON part."H-ID" = pages.page
+) AS witness_pages"""
+
 LOSTMA_TABLES = {
     "text": {
         "safe_sql_name": "TextTable",
         "is_corpus_data": True,
-        "len_query": "SELECT COUNT(*) FROM TextTable WHERE language_COLUMN = ?;",
-        "detail_query": "FROM TextTable WHERE language_COLUMN = ?;",
-        "action_required": "SELECT count(*) FROM TextTable "
-                           "WHERE review_status = 'Action required' AND language_COLUMN = ?;",
+        "is_action_required": True,
+        "scope_query": "SELECT TextTable.\"H-ID\", TextTable.language_COLUMN FROM TextTable "
+                       "WHERE TextTable.language_COLUMN IS NOT NULL",
         "type": "My record types"
     },
     "witness": {
             "safe_sql_name": "Witness",
             "is_corpus_data": True,
-            "len_query": "SELECT COUNT(*) FROM witness "
-                         "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                         "WHERE TextTable.language_COLUMN = ?;",
-            "detail_query": "FROM witness "
-                            "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                            "WHERE TextTable.language_COLUMN = ?;",
-            "action_required": "SELECT count(*) FROM witness "
-                               "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                               "WHERE witness.review_status = 'Action required' AND TextTable.language_COLUMN = ?;",
+            "is_action_required": True,
+            "scope_query": "SELECT witness.\"H-ID\", scope.language FROM witness "
+                           "INNER JOIN corpus_scope AS scope ON scope.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
+                           "WHERE scope.table_name = 'TextTable'",
             "type": "My record types"
         },
     "part": {
             "safe_sql_name": "Part",
             "is_corpus_data": True,
-            "len_query": "SELECT COUNT(DISTINCT part.\"H-ID\") FROM part "
-                         "INNER JOIN witness ON True "
-                         "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                         "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                         "WHERE TextTable.language_COLUMN = ?;",
-            "detail_query": "FROM part "
-                            "INNER JOIN witness ON True "
-                            "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                            "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                            "WHERE TextTable.language_COLUMN = ?;",
-            "action_required": "SELECT count(DISTINCT part.\"H-ID\") FROM part "
-                               "INNER JOIN witness ON True "
-                               "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                               "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                               "WHERE part.review_status = 'Action required' AND TextTable.language_COLUMN = ?;",
+            "is_action_required": True,
+            "scope_query": "SELECT part.\"H-ID\", scope.language FROM "
+                           "(SELECT \"H-ID\", UNNEST(\"observed_on_pages H-ID\") AS part_id FROM witness) AS w "
+                           "INNER JOIN corpus_scope AS scope ON scope.\"H-ID\" = w.\"H-ID\" "
+                           "INNER JOIN part ON part.\"H-ID\" = w.part_id "
+                           "WHERE scope.table_name = 'Witness'",
             "type": "My record types"
         },
     "document": {
             "safe_sql_name": "DocumentTable",
             "is_corpus_data": True,
-            "len_query": "SELECT COUNT(DISTINCT DocumentTable.\"H-ID\") FROM DocumentTable "
-                         "INNER JOIN part ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\" "
-                         "INNER JOIN witness ON True "
-                         "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                         "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                         "WHERE TextTable.language_COLUMN = ?;",
-            "detail_query": "FROM DocumentTable "
-                            "INNER JOIN part ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\" "
-                            "INNER JOIN witness ON True "
-                            "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                            "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                            "WHERE TextTable.language_COLUMN = ?;",
-            "action_required": "SELECT count(DISTINCT DocumentTable.\"H-ID\") FROM DocumentTable "
-                               "INNER JOIN part ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\" "
-                               "INNER JOIN witness ON True "
-                               "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                               "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                               "WHERE DocumentTable.review_status = 'Action required' "
-                               "AND TextTable.language_COLUMN = ?;",
+            "is_action_required": True,
+            "scope_query": "SELECT DocumentTable.\"H-ID\", scope.language FROM DocumentTable "
+                           "INNER JOIN part ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\" "
+                           "INNER JOIN corpus_scope AS scope ON scope.\"H-ID\" = part.\"H-ID\" "
+                           "WHERE scope.table_name = 'Part'",
             "type": "My record types"
         },
     "digitization": {
             "safe_sql_name": "Digitization",
             "is_corpus_data": True,
-            "len_query": "SELECT COUNT(DISTINCT digitization.\"H-ID\") FROM digitization "
-                         "INNER JOIN DocumentTable ON True "
-                         "INNER JOIN UNNEST(digitization.\"digitization_of H-ID\") "
-                         "AS d ON d.unnest = DocumentTable.\"H-ID\" "
-                         "INNER JOIN part ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\" "
-                         "INNER JOIN witness ON True "
-                         "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                         "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                         "WHERE TextTable.language_COLUMN = ?;",
-            "detail_query": "FROM digitization "
-                            "INNER JOIN DocumentTable ON True "
-                            "INNER JOIN UNNEST(digitization.\"digitization_of H-ID\") "
-                            "AS d ON d.unnest = DocumentTable.\"H-ID\" "
-                            "INNER JOIN part ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\" "
-                            "INNER JOIN witness ON True "
-                            "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                            "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                            "WHERE TextTable.language_COLUMN = ?;",
-            "action_required": None,
+            "is_action_required": False,
+            "scope_query": "SELECT d.\"H-ID\", scope.language FROM "
+                           "(SELECT \"H-ID\", UNNEST(\"digitization_of H-ID\") AS document_id FROM digitization) AS d "
+                           "INNER JOIN corpus_scope AS scope ON scope.\"H-ID\" = d.document_id "
+                           "WHERE scope.table_name = 'DocumentTable'",
             "type": "My record types"
         },
     "physDesc": {
             "safe_sql_name": "PhysDesc",
             "is_corpus_data": True,
-            "len_query": "SELECT COUNT(DISTINCT physDesc.\"H-ID\") FROM physDesc "
-                         "INNER JOIN part ON part.\"physical_description H-ID\" = physDesc.\"H-ID\" "
-                         "INNER JOIN witness ON True "
-                         "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                         "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                         "WHERE TextTable.language_COLUMN = ?;",
-            "detail_query": "FROM PhysDesc "
-                            "INNER JOIN part ON part.\"physical_description H-ID\" = PhysDesc.\"H-ID\" "
-                            "INNER JOIN witness ON True "
-                            "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                            "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                            "WHERE TextTable.language_COLUMN = ?;",
-            "action_required": "SELECT count(DISTINCT PhysDesc.\"H-ID\") FROM PhysDesc "
-                               "INNER JOIN part ON part.\"physical_description H-ID\" = PhysDesc.\"H-ID\" "
-                               "INNER JOIN witness ON True "
-                               "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
-                               "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
-                               "WHERE PhysDesc.review_status = 'Action required' AND TextTable.language_COLUMN = ?;",
+            "is_action_required": True,
+            "scope_query": "SELECT PhysDesc.\"H-ID\", scope.language FROM PhysDesc "
+                           "INNER JOIN part ON part.\"physical_description H-ID\" = PhysDesc.\"H-ID\" "
+                           "INNER JOIN corpus_scope AS scope ON scope.\"H-ID\" = part.\"H-ID\" "
+                           "WHERE scope.table_name = 'Part'",
             "type": "My record types"
         },
     "stemma": {
             "safe_sql_name": "Stemma",
             "is_corpus_data": True,
-            "len_query": "SELECT count(DISTINCT stemma.\"H-ID\") FROM stemma "
-                         "INNER JOIN TextTable ON True "
-                         "INNER JOIN UNNEST(TextTable.\"in_stemma H-ID\") AS s ON s.unnest = stemma.\"H-ID\" "
-                         "WHERE TextTable.language_COLUMN = ?;",
-            "detail_query": "FROM stemma "
-                            "INNER JOIN TextTable ON True "
-                            "INNER JOIN UNNEST(TextTable.\"in_stemma H-ID\") AS s ON s.unnest = stemma.\"H-ID\" "
-                            "WHERE TextTable.language_COLUMN = ?;",
-            "action_required": None,
+            "is_action_required": False,
+            "scope_query": "SELECT stemma.\"H-ID\", scope.language FROM "
+                           "(SELECT \"H-ID\", UNNEST(\"in_stemma H-ID\") AS stemma_id FROM TextTable) AS t "
+                           "INNER JOIN corpus_scope AS scope ON scope.\"H-ID\" = t.\"H-ID\" "
+                           "INNER JOIN stemma ON stemma.\"H-ID\" = t.stemma_id "
+                           "WHERE scope.table_name = 'TextTable'",
             "type": "My record types"
         },
     "scripta": {
             "safe_sql_name": "Scripta",
             "is_corpus_data": True,
-            "len_query": "SELECT count(DISTINCT scripta.\"H-ID\") FROM scripta "
-                         "WHERE scripta.language_COLUMN = ?;",
-            "detail_query": "FROM scripta "
-                            "WHERE TextTable.language_COLUMN = ?;",
-            "action_required": "SELECT count(DISTINCT scripta.\"H-ID\") FROM scripta "
-                               "WHERE scripta.review_status = 'Action required' AND scripta.language_COLUMN = ?;",
+            "is_action_required": True,
+            "scope_query": "SELECT scripta.\"H-ID\", scripta.language_COLUMN FROM scripta "
+                           "WHERE scripta.language_COLUMN IS NOT NULL",
             "type": "My record types"
     },
     "images": {
@@ -228,11 +184,87 @@ LOSTMA_TABLES = {
         "is_action_required": False,
         "type": "Bibliography"
     },
+    "corpus tables": {
+        "len_query": "SELECT count(*) FROM corpus_scope WHERE table_name = '{table}' AND language = ?;",
+        "detail_query": "FROM {table} "
+                        "INNER JOIN corpus_scope AS scope ON scope.\"H-ID\" = {table}.\"H-ID\" "
+                        "WHERE scope.table_name = '{table}' AND scope.language = ?;",
+        "action_required": "SELECT count(*) FROM {table} "
+                           "INNER JOIN corpus_scope AS scope ON scope.\"H-ID\" = {table}.\"H-ID\" "
+                           "WHERE {table}.review_status = 'Action required' "
+                           "AND scope.table_name = '{table}' AND scope.language = ?;",
+        "group_query": "FROM {table} "
+                       "INNER JOIN corpus_scope AS scope ON scope.\"H-ID\" = {table}.\"H-ID\" "
+                       "WHERE scope.table_name = '{table}' AND scope.language IN (SELECT * FROM UNNEST(?)) "
+                       "GROUP BY scope.language;"
+    },
     "non-corpus tables": {
         "len_query": "SELECT count(DISTINCT {table}.\"H-ID\") FROM {table}",
         "action_required": "SELECT count(DISTINCT {table}.\"H-ID\") FROM {table} "
-                           "WHERE {table}.review_status = 'Action required'"
+                           "WHERE {table}.review_status = 'Action required'",
+        "group_query": "FROM {table};"
 
+    },
+    "corpus slices": {
+        "create_query": "CREATE OR REPLACE TABLE {corpus} AS "
+                        "SELECT scope.language AS corpus_language, {table}.* FROM {table} "
+                        "INNER JOIN corpus_scope AS scope ON scope.\"H-ID\" = {table}.\"H-ID\" "
+                        "WHERE scope.table_name = '{table}' "
+                        "ORDER BY scope.language, {table}.\"H-ID\";",
+        # the slice of some languages, in place of the whole table: a record in several of them is kept once
+        "source": "(SELECT * EXCLUDE (corpus_language) FROM {corpus} WHERE corpus_language IN ({languages})) "
+                  "AS {table}",
+        "multi_source": "(SELECT DISTINCT ON (\"H-ID\") * EXCLUDE (corpus_language) FROM {corpus} "
+                        "WHERE corpus_language IN ({languages})) AS {table}",
+        "len_query": "SELECT count(*) FROM {corpus} WHERE corpus_language = ?;",
+        "detail_query": "FROM {corpus} AS {table} WHERE {table}.corpus_language = ?;",
+        "action_required": "SELECT count(*) FROM {corpus} AS {table} "
+                           "WHERE {table}.review_status = 'Action required' AND {table}.corpus_language = ?;",
+        "group_query": "FROM {corpus} AS {table} "
+                       "WHERE {table}.corpus_language IN (SELECT * FROM UNNEST(?)) "
+                       "GROUP BY {table}.corpus_language;"
+    },
+    "parquet": {
+        # a record is written in the partition of each of its languages, or in the default one without any
+        "corpus_export": "COPY (SELECT scope.language AS corpus_language, {table}.* FROM {table} "
+                         "LEFT JOIN corpus_scope AS scope "
+                         "ON scope.\"H-ID\" = {table}.\"H-ID\" AND scope.table_name = '{table}' "
+                         "ORDER BY {table}.\"H-ID\") "
+                         "TO '{path}' (FORMAT parquet, PARTITION_BY (corpus_language), "
+                         "COMPRESSION {compression}, OVERWRITE);",
+        "export": "COPY {table} TO '{path}' (FORMAT parquet, COMPRESSION {compression});",
+        # the partitions are read as the slices of build_corpus_tables, the table keeps each record once
+        "corpus_view": "CREATE OR REPLACE VIEW {corpus} AS FROM read_parquet('{path}/*/*.parquet', "
+                       "hive_partitioning = true, hive_types = {{'corpus_language': VARCHAR}});",
+        "table_view": "CREATE OR REPLACE VIEW {table} AS "
+                      "SELECT DISTINCT ON (\"H-ID\") * EXCLUDE (corpus_language) FROM {corpus};",
+        "view": "CREATE OR REPLACE VIEW {table} AS FROM read_parquet('{path}');"
     }
 
-}
\ No newline at end of file
+}
+
+# relations of the tradition graph, source -> target (see graph.py), between existing records only
+TRADITION_EDGES = [
+    {"source": "text", "target": "witness",
+     "query": "SELECT TextTable.\"H-ID\" AS source, witness.\"H-ID\" AS target FROM witness "
+              "INNER JOIN TextTable ON witness.\"is_manifestation_of H-ID\" = TextTable.\"H-ID\""},
+    {"source": "witness", "target": "part",
+     "query": "SELECT witness_id AS source, part_id AS target FROM "
+              + WITNESS_PAGES.format(witness="Witness", part="Part")},
+    {"source": "part", "target": "document",
+     "query": "SELECT part.\"H-ID\" AS source, DocumentTable.\"H-ID\" AS target FROM part "
+              "INNER JOIN DocumentTable ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\""},
+    {"source": "text", "target": "stemma",
+     "query": "SELECT DISTINCT t.\"H-ID\" AS source, stemma.\"H-ID\" AS target FROM "
+              "(SELECT \"H-ID\", UNNEST(\"in_stemma H-ID\") AS stemma_id FROM TextTable) AS t "
+              "INNER JOIN stemma ON stemma.\"H-ID\" = t.stemma_id"},
+]
+# every pair (ancestor, descendant) linked by a path of relations, with the length of the path
+TRADITION_CLOSURE_TABLE = "tradition_closure"
+INTERNAL_TABLES.append(TRADITION_CLOSURE_TABLE)
+# indexes written next to the tables by LostmaDB.export_parquet
+PARQUET_INDEXES = [SCOPE_TABLE, DATE_INDEX_TABLE, TRADITION_CLOSURE_TABLE]
+
+CORPUS_TABLES = {table["safe_sql_name"]: CORPUS_TABLE.format(table=table["safe_sql_name"])
+                 for table in LOSTMA_TABLES.values() if table.get("is_corpus_data")}
+INTERNAL_TABLES += list(CORPUS_TABLES.values())
\ No newline at end of file
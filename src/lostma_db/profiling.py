@@ -0,0 +1,166 @@
+from __future__ import annotations
+import csv
+import functools
+import inspect
+import json
+import threading
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+
+"""
+Here is the opt-in profiling of the requests of LostmaDB (see LostmaDB.start_profiling)
+    Each request is recorded with its wall time, its rows, its bytes in memory
+    and the public method of LostmaDB which sent it (texts, witnesses, analyse...)
+"""
+
+# public method of LostmaDB running in the current context: the outermost one is kept
+_METHOD: ContextVar[str | None] = ContextVar("lostma_method", default=None)
+
+
+def traced(func):
+    """
+    Tag the requests sent while a public method runs with its name
+    """
+    name = func.__name__
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            gen = func(*args, **kwargs)
+            try:
+                while True:
+                    # the tag is only set while the generator runs, not between two batches
+                    token = _METHOD.set(name) if _METHOD.get() is None else None
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        if token is not None:
+                            _METHOD.reset(token)
+                    yield item
+            finally:
+                gen.close()
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _METHOD.get() is not None:
+            return func(*args, **kwargs)
+        token = _METHOD.set(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _METHOD.reset(token)
+    return wrapper
+
+
+def current_method() -> str | None:
+    return _METHOD.get()
+
+
+def result_size(res) -> tuple[int | None, int | None]:
+    """Rows and bytes of a result: pandas, Arrow table or batch, polars (a stream is not measured)"""
+    if hasattr(res, "memory_usage"):
+        return len(res), int(res.memory_usage(deep=True).sum())
+    if hasattr(res, "nbytes") and hasattr(res, "num_rows"):
+        return res.num_rows, int(res.nbytes)
+    if hasattr(res, "estimated_size"):
+        return res.height, int(res.estimated_size())
+    return None, None
+
+
+@dataclass
+class QueryRecord:
+    method: str | None
+    query: str
+    params: str | None
+    started: float
+    wall_time: float
+    rows: int | None
+    bytes: int | None
+    cached: bool
+    # EXPLAIN ANALYZE of the requests slower than the threshold
+    profile: str | None = None
+
+
+class QueryProfiler:
+    """
+    In-memory trace of the requests, with an exporter in JSON or CSV
+        slow_threshold: in seconds, the slower read requests are run again with EXPLAIN ANALYZE
+        max_records: only the last records are kept
+    """
+    def __init__(self, slow_threshold: float | None = None, max_records: int = 10_000):
+        self.slow_threshold = slow_threshold
+        self.records: deque[QueryRecord] = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, query: str, params, started: float, wall_time: float, res=None,
+               cached: bool = False, explain=None, size: tuple[int, int] = None,
+               method: str = None) -> QueryRecord:
+        """
+        Record a request: its result res is measured, unless its size (rows, bytes) is given
+            explain is called for the slow requests, to get their profile
+            method: the public method which sent the request, the current one by default
+        """
+        rows, nbytes = size or result_size(res)
+        profile = None
+        if explain is not None and not cached and self.slow_threshold is not None \
+                and wall_time >= self.slow_threshold:
+            profile = explain()
+        record = QueryRecord(
+            method=method or current_method(),
+            query=query,
+            params=None if params is None else repr(params),
+            started=started,
+            wall_time=wall_time,
+            rows=rows,
+            bytes=nbytes,
+            cached=cached,
+            profile=profile,
+        )
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def trace(self) -> list[dict]:
+        with self._lock:
+            return [asdict(record) for record in self.records]
+
+    def summary(self) -> list[dict]:
+        """
+        Time spent by method, slowest first
+        """
+        methods = {}
+        for record in self.trace():
+            stats = methods.setdefault(record["method"], {"method": record["method"], "requests": 0,
+                                                          "cached": 0, "wall time": 0.0, "max time": 0.0})
+            stats["requests"] += 1
+            stats["cached"] += record["cached"]
+            stats["wall time"] += record["wall_time"]
+            stats["max time"] = max(stats["max time"], record["wall_time"])
+        return sorted(methods.values(), key=lambda stats: stats["wall time"], reverse=True)
+
+    def export(self, path: Path | str, file_format: str = None) -> Path:
+        """
+        Write the trace in a JSON or CSV file (format given by the suffix of the path by default)
+        """
+        path = Path(path)
+        file_format = file_format or path.suffix.lstrip(".").lower()
+        records = self.trace()
+        if file_format == "json":
+            with open(path, "w") as f:
+                json.dump(records, f, indent=2)
+        elif file_format == "csv":
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=[field.name for field in fields(QueryRecord)])
+                writer.writeheader()
+                writer.writerows(records)
+        else:
+            raise ValueError(f"Unknown export format {file_format!r}, choose between 'json' and 'csv'")
+        return path
+
+    def clear(self) -> None:
+        with self._lock:
+            self.records.clear()
@@ -0,0 +1,245 @@
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from .client import LostmaDB
+from .lostma_tables import LOSTMA_TABLES, SCOPE_TABLE
+
+"""
+Here is the command line of the nightly QA reports: heurist-analyser report
+    The reports run concurrently (threads, or processes with --processes) on a copy of lostma.db,
+    so that a sync of the db can go on in the meantime
+    Each kind of report is written in a Parquet (or JSON) file, with the timing of each report in timings.json
+"""
+
+# reports of analyse.py: they open the db file themselves
+FILE_REPORTS = ["count_log", "count_required_data", "collect_presence_data", "validation_enum"]
+REPORT_KINDS = ["analyse"] + FILE_REPORTS
+
+# state of a worker (a thread pool shares it): the db of the analyse reports and the paths of the others
+_WORKER = {}
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="heurist-analyser", description="Analyser for Heurist DB")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="run the QA reports concurrently and write their results")
+    report.add_argument("--db", type=Path, default=Path("lostma.db"), help="db file (default: lostma.db)")
+    report.add_argument("--schema", type=Path, default=Path("jbcamps_gestes_schema"),
+                        help="directory of the schema CSV files (default: jbcamps_gestes_schema)")
+    report.add_argument("--log", type=Path, default=Path("validation.log"),
+                        help="validation log of the CLI (default: validation.log)")
+    report.add_argument("--kinds", nargs="+", choices=REPORT_KINDS, default=REPORT_KINDS,
+                        help="kinds of report (default: all)")
+    report.add_argument("--tables", nargs="+", help="tables of analyse, ex: witness text (default: all)")
+    report.add_argument("--languages", nargs="+",
+                        help="languages of analyse, ex: 'dum (Middle Dutch)' (default: all)")
+    report.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="reports running at once")
+    report.add_argument("--processes", action="store_true", help="a pool of processes instead of threads")
+    report.add_argument("--format", choices=["parquet", "json"], default="parquet", dest="file_format")
+    report.add_argument("--out", type=Path, default=Path("reports"), help="output directory (default: reports)")
+    args = parser.parse_args(argv)
+    return run_reports(args.db, args.schema, args.log, args.kinds, args.tables, args.languages,
+                       args.workers, args.processes, args.file_format, args.out)
+
+
+def run_reports(db_path: Path, schema_dir: Path, log_path: Path, kinds: list[str], tables: list[str] = None,
+                languages: list[str] = None, workers: int = 4, processes: bool = False,
+                file_format: str = "parquet", out: Path = Path("reports")) -> int:
+    """
+    Run the reports and write their results in out, return 1 if one of them failed
+    """
+    if not Path(db_path).is_file():
+        print(f"No db file {db_path}: download it first (LostmaDB.sync)")
+        return 1
+    start = time.perf_counter()
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="lostma-report-") as workdir:
+        snapshot = copy_db(db_path, Path(workdir) / "lostma.db")
+        try:
+            tasks = plan_tasks(snapshot, schema_dir, kinds, tables, languages)
+        except ValueError as error:
+            print(error)
+            return 1
+        workers = max(1, min(workers, len(tasks)))
+        print(f"{len(tasks)} reports on a copy of {db_path}, "
+              f"{workers} workers ({'processes' if processes else 'threads'})")
+        context = (str(snapshot), str(schema_dir.resolve()), str(log_path.resolve()))
+        if processes:
+            # spawn: a worker does not inherit the DuckDB threads of this process
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=init_worker, initargs=context)
+        else:
+            # the threads share the db of the reports
+            init_worker(*context)
+            pool = ThreadPoolExecutor(max_workers=workers)
+        results, timings = {}, []
+        try:
+            with pool:
+                futures = {pool.submit(run_task, kind, args): (kind, args) for (kind, args) in tasks}
+                for future in as_completed(futures):
+                    kind, args = futures[future]
+                    label = " ".join([kind] + [arg for arg in args if arg])
+                    try:
+                        records, seconds = future.result()
+                    except Exception as error:
+                        timings.append({"report": label, "kind": kind, "seconds": None, "rows": None,
+                                        "error": f"{type(error).__name__}: {error}"})
+                        print(f"{label:<48} FAILED {type(error).__name__}: {error}")
+                        continue
+                    results.setdefault(kind, []).extend(records)
+                    timings.append({"report": label, "kind": kind, "seconds": round(seconds, 4),
+                                    "rows": len(records), "error": None})
+                    print(f"{label:<48} {seconds:8.3f} s  {len(records):>6} rows")
+        finally:
+            close_worker()
+    for kind in kinds:
+        if kind in results:
+            write_records(results[kind], out / f"{kind}.{file_format}", file_format)
+    with open(out / "timings.json", "w") as f:
+        json.dump(sorted(timings, key=lambda t: t["report"]), f, indent=2)
+    total = time.perf_counter() - start
+    report_time = sum(t["seconds"] or 0 for t in timings)
+    failed = sum(t["error"] is not None for t in timings)
+    print(f"{len(timings)} reports in {total:.2f} s ({report_time:.2f} s of reports), {failed} failed, "
+          f"results in {out}")
+    return 1 if failed else 0
+
+
+def copy_db(db_path: Path, snapshot: Path) -> Path:
+    """Copy the db file, with its write-ahead log if there is one"""
+    shutil.copyfile(db_path, snapshot)
+    wal = Path(db_path).with_name(Path(db_path).name + ".wal")
+    if wal.is_file():
+        shutil.copyfile(wal, snapshot.with_name(snapshot.name + ".wal"))
+    return snapshot
+
+
+def plan_tasks(snapshot: Path, schema_dir: Path, kinds: list[str], tables: list[str] = None,
+               languages: list[str] = None) -> list[tuple[str, tuple]]:
+    """
+    Reports to run: one for each table and language of analyse, one for each file report
+        The scope index is built on the copy beforehand, the workers only read it
+    """
+    tasks = []
+    if "analyse" in kinds:
+        db = LostmaDB(None, None, duckdb_path=snapshot, cache_bytes=0)
+        db.schema_dir = schema_dir
+        try:
+            if not db._has_table(SCOPE_TABLE):
+                db.build_scope_index()
+            if not languages:
+                languages = [r[0] for r in db._fetch(f"SELECT DISTINCT language FROM {SCOPE_TABLE} "
+                                                     "ORDER BY language;")]
+            names = [name for name in LOSTMA_TABLES if "safe_sql_name" in LOSTMA_TABLES[name]]
+            if tables:
+                tables = [t[0].lower() + t[1:] for t in tables]
+                unknown = [t for t in tables if t not in names]
+                if unknown:
+                    raise ValueError(f"Unknown tables {unknown}, choose among {names}")
+                names = tables
+            for name in names:
+                # a table missing from the db is left out (analyse would download it)
+                if not db._has_table(LOSTMA_TABLES[name]["safe_sql_name"]):
+                    continue
+                if LOSTMA_TABLES[name]["is_corpus_data"]:
+                    tasks += [("analyse", (name, language)) for language in languages]
+                else:
+                    tasks.append(("analyse", (name, None)))
+        finally:
+            db._close_connection()
+    tasks += [(kind, ()) for kind in FILE_REPORTS if kind in kinds]
+    return tasks
+
+
+def init_worker(snapshot: str, schema_dir: str, log_path: str) -> None:
+    """
+    Open the copy of the db in a worker, in read-only mode: the processes of a pool share the file
+        The paths are kept in the worker and given to the reports of analyse.py, whose own paths are left as
+        they were; count_log, which stores the log in the db, has a copy of its own (see run_task)
+    """
+    snapshot = Path(snapshot)
+    db = LostmaDB(None, None, duckdb_path=snapshot, cache_bytes=0, read_only=True)
+    db.schema_dir = Path(schema_dir)
+    _WORKER.update(db=db, snapshot=snapshot, schema_dir=Path(schema_dir), log_path=Path(log_path))
+
+
+def close_worker() -> None:
+    """Close the db of a worker, and forget its paths"""
+    db = _WORKER.pop("db", None)
+    _WORKER.clear()
+    if db is not None:
+        db._close_connection()
+
+
+def run_task(kind: str, args: tuple) -> tuple[list[dict], float]:
+    """Run a report, return its rows and its wall time"""
+    from . import analyse as reports
+    start = time.perf_counter()
+    snapshot = _WORKER["snapshot"]
+    # the same configuration as the db of the worker: they share one instance of DuckDB
+    paths = {"db_path": snapshot, "schema_dir": _WORKER["schema_dir"], "read_only": True}
+    if kind == "analyse":
+        (name, language) = args
+        records = analyse_records(_WORKER["db"], name, language)
+    elif kind == "count_log":
+        scratch = copy_db(snapshot, snapshot.with_name(f"{kind}-{os.getpid()}.db"))
+        records = to_records(reports.count_log(db_path=scratch, log_path=_WORKER["log_path"]))
+    elif kind == "collect_presence_data":
+        records = to_records(reports.collect_presence_data(**paths)[0])
+    else:
+        records = to_records(getattr(reports, kind)(**paths))
+    return records, time.perf_counter() - start
+
+
+def analyse_records(db: LostmaDB, name_table: str, language: str = None) -> list[dict]:
+    result = db.analyse(name_table, language, result_format="pandas")
+    if isinstance(result, str):
+        # "No data"
+        return []
+    records = []
+    for row in result["completeness table"].to_dict("records"):
+        records.append({"table": name_table, "language": language, **row,
+                        "total records": result["total records"],
+                        "action required": str(result["action required"])})
+    return records
+
+
+def to_records(report: dict) -> list[dict]:
+    """
+    Rows of a report: {table: {metric: value}} or {table: {field: {metric: value}}}
+    """
+    records = []
+    for (table, values) in report.items():
+        if not values:
+            continue
+        if all(isinstance(value, dict) for value in values.values()):
+            records += [{"table": table, "field": field, **metrics} for (field, metrics) in values.items()]
+        else:
+            records.append({"table": table, **values})
+    return records
+
+
+def write_records(records: list[dict], path: Path, file_format: str) -> Path:
+    if file_format == "json":
+        with open(path, "w") as f:
+            json.dump(records, f, indent=2, default=str)
+        return path
+    import duckdb
+    import pandas as pd
+    df = pd.DataFrame(records)
+    with duckdb.connect() as con:
+        con.from_df(df).write_parquet(str(path), compression="zstd")
+    return path
+
+
+if __name__ == "__main__":
+    sys.exit(main())
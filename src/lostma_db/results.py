@@ -0,0 +1,112 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import duckdb
+    import pyarrow as pa
+
+"""
+Here are the formats of the results returned by LostmaDB
+    pandas (default): a DataFrame, the values are copied into numpy/python objects
+    arrow: a pyarrow.Table, handed over by DuckDB without any copy
+    reader: a pyarrow.RecordBatchReader, streaming the result by batches on a cursor of its own
+    polars: a polars DataFrame, built on the Arrow buffers
+"""
+
+RESULT_FORMATS = ["pandas", "arrow", "reader", "polars"]
+# formats of the batches yielded by the iter_* methods
+BATCH_FORMATS = ["arrow", "pandas", "polars"]
+BATCH_SIZE = 100_000
+
+
+def check_result_format(result_format: str) -> None:
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format {result_format!r}, choose among {RESULT_FORMATS}")
+
+
+def to_arrow_reader(res: duckdb.DuckDBPyConnection, batch_size: int = BATCH_SIZE) -> pa.RecordBatchReader:
+    # fetch_record_batch is deprecated since DuckDB 1.5, to_arrow_reader does not exist before
+    if hasattr(res, "to_arrow_reader"):
+        return res.to_arrow_reader(batch_size)
+    return res.fetch_record_batch(batch_size)
+
+
+def to_arrow_table(res: duckdb.DuckDBPyConnection) -> pa.Table:
+    if hasattr(res, "to_arrow_table"):
+        return res.to_arrow_table()
+    return res.fetch_arrow_table()
+
+
+def fetch_result(res: duckdb.DuckDBPyConnection, result_format: str = "pandas"):
+    """
+    Fetch the result of an executed request in the given format
+    """
+    if result_format == "arrow":
+        return to_arrow_table(res)
+    if result_format == "reader":
+        # the result is fetched at once: the cursor can run the next request (see to_owned_reader)
+        return to_arrow_table(res).to_reader()
+    if result_format == "polars":
+        return res.pl()
+    return res.fetchdf()
+
+
+def to_owned_reader(cursor: duckdb.DuckDBPyConnection, batch_size: int = BATCH_SIZE) -> pa.RecordBatchReader:
+    """
+    Stream the result of a cursor of its own, which nothing else uses, and close the cursor once it is read
+    """
+    import pyarrow as pa
+    reader = to_arrow_reader(cursor, batch_size)
+
+    def batches():
+        try:
+            yield from reader
+        finally:
+            cursor.close()
+
+    return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+
+def from_arrow(table: pa.Table, result_format: str):
+    """
+    Give an Arrow table in another format, without copying the Arrow buffers when possible
+    """
+    if result_format == "reader":
+        return table.to_reader()
+    if result_format == "polars":
+        import polars as pl
+        return pl.from_arrow(table)
+    if result_format == "pandas":
+        return table.to_pandas()
+    return table
+
+
+def from_batch(batch: pa.RecordBatch, result_format: str = "arrow"):
+    """
+    Give a record batch in one of the BATCH_FORMATS
+    """
+    if result_format == "pandas":
+        return batch.to_pandas()
+    if result_format == "polars":
+        import polars as pl
+        return pl.from_arrow(batch)
+    return batch
+
+
+def from_records(records: list[dict], result_format: str = "pandas"):
+    """
+    Build a result from a list of rows made in python
+    """
+    if result_format == "pandas":
+        import pandas as pd
+        return pd.DataFrame(records)
+    import pyarrow as pa
+    # the names of the columns, in the order of their first row
+    names = dict.fromkeys(name for row in records for name in row)
+    columns = {name: [row.get(name) for row in records] for name in names}
+    for (name, values) in columns.items():
+        # Arrow columns have one type: a column mixing numbers and messages
+        # (ex: "No field for this table") is given as text
+        if len({type(v) for v in values if v is not None}) > 1:
+            columns[name] = [None if v is None else str(v) for v in values]
+    return from_arrow(pa.table(columns), result_format)
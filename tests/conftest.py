@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+from lostma_db import LostmaDB
+
+FAKE_CLI = Path(__file__).resolve().parent / "fake_heurist.py"
+BENCHMARKS = Path(__file__).resolve().parent.parent / "benchmarks"
+sys.path.insert(0, str(BENCHMARKS))
+
+import synthetic  # noqa: E402
+
+# the synthetic db of the benchmarks, small: 200 texts, 600 witnesses...
+SYNTHETIC_SCALE = 0.2
+
+
+class FakeHeurist:
+    """Data of the fake CLI (see fake_heurist.py), and the calls it received"""
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.spec = {
+            "tables": {
+                "TextTable": {"group": "My record types",
+                              "columns": ['"H-ID" BIGINT', "title VARCHAR", "language_COLUMN VARCHAR",
+                                          '"in_stemma H-ID" BIGINT[]'],
+                              "rows": [[1, "text 1", "fro (Old French)", []], [2, "text 2", "lat (Latin)", []]]},
+                "Witness": {"group": "My record types",
+                            "columns": ['"H-ID" BIGINT', '"is_manifestation_of H-ID" BIGINT',
+                                        '"observed_on_pages H-ID" BIGINT[]', "siglum VARCHAR"],
+                            "rows": [[10, 1, [], "witness 10"]]},
+                "Book": {"group": "Bibliography", "columns": ['"H-ID" BIGINT', "title VARCHAR"],
+                         "rows": [[100, "book 100"]]},
+            },
+            "schema": {
+                "TextTable.csv": {"group": "My record types", "content": "rst_DisplayName\ntitle\n"},
+                "Witness.csv": {"group": "My record types", "content": "rst_DisplayName\nsiglum\n"},
+                "Book.csv": {"group": "Bibliography", "content": "rst_DisplayName\ntitle\n"},
+            },
+            "fail": 0,
+            "delay": 0,
+        }
+        self.save()
+
+    def save(self) -> None:
+        (self.directory / "spec.json").write_text(json.dumps(self.spec))
+
+    def calls(self) -> list[str]:
+        log = self.directory / "calls.log"
+        return log.read_text().splitlines() if log.is_file() else []
+
+
+@pytest.fixture
+def fake_cli(tmp_path, monkeypatch) -> FakeHeurist:
+    directory = tmp_path / "fake"
+    directory.mkdir()
+    cli = directory / "heurist"
+    cli.write_text(f"#!{sys.executable}\nimport runpy\nrunpy.run_path({str(FAKE_CLI)!r}, run_name='__main__')\n")
+    cli.chmod(0o755)
+    monkeypatch.setenv("FAKE_HEURIST_DIR", str(directory))
+    monkeypatch.setenv("PATH", f"{directory}{os.pathsep}{os.environ['PATH']}")
+    # the schema directory of LostmaDB is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return FakeHeurist(directory)
+
+
+@pytest.fixture
+def db(fake_cli, tmp_path):
+    db = LostmaDB("login", "password", duckdb_path=tmp_path / "lostma.db", cache_bytes=0)
+    yield db
+    db._close_connection()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cache_home(tmp_path_factory):
+    # the compiled schemas are cached out of the home directory
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        directory = tmp_path_factory.mktemp("cache")
+        monkeypatch.setenv("XDG_CACHE_HOME", str(directory))
+        yield directory
+
+
+@pytest.fixture(scope="session")
+def synthetic_files(tmp_path_factory) -> tuple[Path, Path, Path]:
+    return synthetic.build(tmp_path_factory.mktemp("synthetic"), SYNTHETIC_SCALE)
+
+
+@pytest.fixture
+def synthetic_db(synthetic_files, tmp_path):
+    # a copy of the db for each test: it can write in it (indexes, slices...)
+    db_path, schema_dir, _ = synthetic_files
+    db = LostmaDB(None, None, duckdb_path=shutil.copyfile(db_path, tmp_path / "lostma.db"), cache_bytes=0)
+    db.schema_dir = schema_dir
+    yield db
+    db._close_connection()
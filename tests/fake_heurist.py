@@ -0,0 +1,56 @@
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+
+"""
+Fake Heurist-API CLI for the tests: it writes a fixture db and schema CSV files, without any download
+    heurist -d DB -l LOGIN -p PASSWORD download -f FILE.DB [-r GROUP]...
+    heurist -d DB -l LOGIN -p PASSWORD schema -t csv [-r GROUP]... [-o DIR]
+Its data are read in $FAKE_HEURIST_DIR/spec.json:
+    {"tables": {table: {"group": group, "columns": [SQL definition, ...], "rows": [[value, ...], ...]}},
+     "schema": {file name: {"group": group, "content": text}},
+     "fail": number of the next calls which fail, "delay": seconds of each call}
+Each call is appended to $FAKE_HEURIST_DIR/calls.log
+"""
+
+
+def main(args: list[str]) -> int:
+    directory = Path(os.environ["FAKE_HEURIST_DIR"])
+    spec = json.loads((directory / "spec.json").read_text())
+    with open(directory / "calls.log", "a") as log:
+        log.write(" ".join(args[6:]) + "\n")
+    time.sleep(spec.get("delay", 0))
+    if spec.get("fail", 0):
+        spec["fail"] -= 1
+        (directory / "spec.json").write_text(json.dumps(spec))
+        print("Download failed")
+        return 1
+    groups = [args[i + 1] for (i, arg) in enumerate(args) if arg == "-r"]
+    if "download" in args:
+        path = Path(args[args.index("-f") + 1])
+        path.unlink(missing_ok=True)
+        with duckdb.connect(path) as con:
+            # the base tables of Heurist are in every file
+            con.execute("CREATE TABLE rty AS SELECT 101 AS rty_ID, 'text' AS rty_Name;")
+            for (table, data) in spec["tables"].items():
+                if groups and data["group"] not in groups:
+                    continue
+                con.execute(f'CREATE TABLE "{table}" ({", ".join(data["columns"])});')
+                if data["rows"]:
+                    con.executemany(f'INSERT INTO "{table}" VALUES ({", ".join(["?"] * len(data["columns"]))});',
+                                    data["rows"])
+    elif "schema" in args:
+        out = Path(args[args.index("-o") + 1]) if "-o" in args else Path("jbcamps_gestes_schema")
+        out.mkdir(parents=True, exist_ok=True)
+        for (name, data) in spec["schema"].items():
+            if not groups or data["group"] in groups:
+                (out / name).write_text(data["content"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
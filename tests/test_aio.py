@@ -0,0 +1,68 @@
+import asyncio
+import subprocess
+
+import pytest
+
+from lostma_db.aio import AsyncLostmaDB
+
+from test_sync import EXPECTED, staging_files, tables
+
+
+def test_async_sync_retry_after_failed_download(db, fake_cli, tmp_path):
+    fake_cli.spec["fail"] = 1
+    fake_cli.save()
+    lines = []
+
+    async def main():
+        await AsyncLostmaDB(db=db).sync(["My record types", "Bibliography"], retries=1, on_progress=lines.append)
+
+    asyncio.run(main())
+    assert any("retrying" in line for line in lines)
+    assert tables(db) == EXPECTED
+    assert staging_files(tmp_path) == []
+
+
+def test_async_sync_failed_download_leaves_db(db, fake_cli, tmp_path):
+    db.sync()
+    fake_cli.spec["fail"] = 10
+    fake_cli.spec["tables"]["Witness"]["rows"] = []
+    fake_cli.save()
+    with pytest.raises(subprocess.CalledProcessError):
+        asyncio.run(AsyncLostmaDB(db=db).sync(retries=1, on_progress=lambda line: None))
+    assert tables(db) == EXPECTED
+    assert staging_files(tmp_path) == []
+
+
+def test_async_sync_waits_for_the_sync_of_a_thread(db, fake_cli):
+    async def main():
+        adb = AsyncLostmaDB(db=db)
+        # a sync of LostmaDB in progress in a thread
+        db._sync_lock.acquire()
+        sync = asyncio.ensure_future(adb.sync(on_progress=lambda line: None))
+        await asyncio.sleep(0.3)
+        # the loop is not blocked, the downloads wait
+        assert not sync.done()
+        assert fake_cli.calls() == []
+        db._sync_lock.release()
+        await sync
+        assert not db._sync_lock.locked()
+
+    asyncio.run(main())
+    assert tables(db) == EXPECTED
+
+
+def test_cancelled_async_sync_gives_back_the_lock(db, fake_cli):
+    async def main():
+        db._sync_lock.acquire()
+        sync = asyncio.ensure_future(AsyncLostmaDB(db=db).sync(on_progress=lambda line: None))
+        await asyncio.sleep(0.1)
+        sync.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await sync
+        db._sync_lock.release()
+
+    asyncio.run(main())
+    # the lock taken by the thread of the cancelled sync is released
+    assert db._sync_lock.acquire(timeout=5)
+    db._sync_lock.release()
+    assert fake_cli.calls() == []
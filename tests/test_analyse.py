@@ -0,0 +1,94 @@
+import pytest
+
+from synthetic import LANGUAGES
+
+from lostma_db.lostma_tables import LOSTMA_TABLES, SCOPE_TABLE
+
+# the records of each corpus table by language, counted with the joins of the requests before the scope index
+FORMER_COUNTS = {
+    "TextTable": "SELECT language_COLUMN, count(*) FROM TextTable GROUP BY ALL;",
+    "Witness": "SELECT TextTable.language_COLUMN, count(*) FROM witness "
+               "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
+               "GROUP BY ALL;",
+    "Part": "SELECT TextTable.language_COLUMN, count(DISTINCT part.\"H-ID\") FROM part "
+            "INNER JOIN witness ON True "
+            "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
+            "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
+            "GROUP BY ALL;",
+    "DocumentTable": "SELECT TextTable.language_COLUMN, count(DISTINCT DocumentTable.\"H-ID\") FROM DocumentTable "
+                     "INNER JOIN part ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\" "
+                     "INNER JOIN witness ON True "
+                     "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
+                     "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
+                     "GROUP BY ALL;",
+    "Digitization": "SELECT TextTable.language_COLUMN, count(DISTINCT digitization.\"H-ID\") FROM digitization "
+                    "INNER JOIN DocumentTable ON True "
+                    "INNER JOIN UNNEST(digitization.\"digitization_of H-ID\") AS d ON d.unnest = DocumentTable.\"H-ID\" "
+                    "INNER JOIN part ON part.\"is_inscribed_on H-ID\" = DocumentTable.\"H-ID\" "
+                    "INNER JOIN witness ON True "
+                    "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
+                    "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
+                    "GROUP BY ALL;",
+    "PhysDesc": "SELECT TextTable.language_COLUMN, count(DISTINCT physDesc.\"H-ID\") FROM physDesc "
+                "INNER JOIN part ON part.\"physical_description H-ID\" = physDesc.\"H-ID\" "
+                "INNER JOIN witness ON True "
+                "INNER JOIN UNNEST(witness.\"observed_on_pages H-ID\") AS w ON w.unnest = part.\"H-ID\" "
+                "INNER JOIN TextTable ON TextTable.\"H-ID\" = witness.\"is_manifestation_of H-ID\" "
+                "GROUP BY ALL;",
+    "Stemma": "SELECT TextTable.language_COLUMN, count(DISTINCT stemma.\"H-ID\") FROM stemma "
+              "INNER JOIN TextTable ON True "
+              "INNER JOIN UNNEST(TextTable.\"in_stemma H-ID\") AS s ON s.unnest = stemma.\"H-ID\" "
+              "GROUP BY ALL;",
+    "Scripta": "SELECT language_COLUMN, count(*) FROM scripta GROUP BY ALL;",
+}
+CORPUS_NAMES = [name for name in LOSTMA_TABLES if LOSTMA_TABLES[name].get("is_corpus_data")]
+
+
+def test_scope_index_matches_former_joins(synthetic_db):
+    synthetic_db.build_scope_index()
+    for (sql_name, query) in FORMER_COUNTS.items():
+        expected = dict(synthetic_db.sql(query, is_df=False).fetchall())
+        expected.pop(None, None)
+        scoped = dict(synthetic_db.sql(f"SELECT language, count(*) FROM {SCOPE_TABLE} WHERE table_name = ? "
+                                       "GROUP BY ALL;", [sql_name], is_df=False).fetchall())
+        assert scoped == expected, sql_name
+        # analyse counts the records of the scope
+        name = next(name for name in CORPUS_NAMES if LOSTMA_TABLES[name]["safe_sql_name"] == sql_name)
+        for language in LANGUAGES:
+            result = synthetic_db.analyse(name, language)
+            if language in expected:
+                assert result["total records"] == expected[language], (sql_name, language)
+            else:
+                assert result == "No data", (sql_name, language)
+
+
+def analyse_rows(db, name: str, language: str = None) -> list[dict]:
+    result = db.analyse(name, language)
+    if result == "No data":
+        return []
+    return [{**row, "total records": result["total records"], "action required": result["action required"]}
+            for row in result["completeness table"].to_dict("records")]
+
+
+@pytest.mark.parametrize("sliced", [False, True])
+def test_analyse_all_matches_analyse(synthetic_db, sliced):
+    if sliced:
+        synthetic_db.build_corpus_tables()
+    matrix = synthetic_db.analyse_all().to_dict("records")
+    for row in matrix:
+        # pandas gives the empty language as NaN
+        if not isinstance(row["language"], str):
+            row["language"] = None
+    names = [name for name in LOSTMA_TABLES if "safe_sql_name" in LOSTMA_TABLES[name]
+             and synthetic_db._has_table(LOSTMA_TABLES[name]["safe_sql_name"])]
+    compared = 0
+    for name in names:
+        # the tables out of the corpora are not scoped by language
+        languages = LANGUAGES if LOSTMA_TABLES[name]["is_corpus_data"] else [None]
+        for language in languages:
+            expected = analyse_rows(synthetic_db, name, language)
+            rows = [{key: value for (key, value) in row.items() if key not in ["table", "language"]}
+                    for row in matrix if row["table"] == name and row["language"] == language]
+            assert rows == expected, (name, language)
+            compared += len(rows)
+    assert compared == len(matrix)
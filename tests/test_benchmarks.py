@@ -0,0 +1,119 @@
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+from lostma_db import LostmaDB
+
+pytest.importorskip("pytest_benchmark")
+
+BENCHMARKS = Path(__file__).resolve().parent.parent / "benchmarks"
+sys.path.insert(0, str(BENCHMARKS))
+
+import run  # noqa: E402
+import synthetic  # noqa: E402
+
+"""
+The benchmarks of benchmarks/run.py under pytest-benchmark, on a synthetic db
+    python -m pytest tests/test_benchmarks.py [--benchmark-autosave] [--benchmark-compare]
+    LOSTMA_BENCHMARK_SCALE sets the scale of the synthetic db (1 by default)
+    python -m pytest --benchmark-skip runs the other tests only
+Each group of benchmarks has its own copy of the db, so that they do not depend on the order of the tests
+"""
+
+SCALE = float(os.environ.get("LOSTMA_BENCHMARK_SCALE", 1))
+# the same rounds as benchmarks/run.py: most benchmarks do the whole work again at each call
+ROUNDS = 3
+# a db which is never opened: the names of the benchmarks
+IDLE = LostmaDB(None, None, duckdb_path="unused.db")
+
+
+@pytest.fixture(scope="module")
+def synthetic_db(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("synthetic")
+    db_path, schema_dir, log_path = synthetic.build(directory, SCALE)
+    db = LostmaDB(None, None, duckdb_path=db_path, cache_bytes=0)
+    db.schema_dir = schema_dir
+    db.build_scope_index()
+    db.build_date_index()
+    db._close_connection()
+    return db_path, schema_dir, log_path
+
+
+def copy_db(synthetic_db, name: str) -> LostmaDB:
+    db_path, schema_dir, _ = synthetic_db
+    copy = shutil.copyfile(db_path, db_path.with_name(f"{name}.db"))
+    db = LostmaDB(None, None, duckdb_path=copy, cache_bytes=0)
+    db.schema_dir = schema_dir
+    return db
+
+
+@pytest.fixture(scope="module")
+def main_db(synthetic_db):
+    db = copy_db(synthetic_db, "main")
+    yield db
+    db._close_connection()
+
+
+@pytest.fixture(scope="module")
+def corpus_db(synthetic_db):
+    db = copy_db(synthetic_db, "corpus")
+    db.build_corpus_tables()
+    yield db
+    db._close_connection()
+
+
+@pytest.fixture(scope="module")
+def parquet_benchmarks(synthetic_db):
+    db = copy_db(synthetic_db, "parquet")
+    directory = db.export_parquet(db.duckdb_path.with_name("parquet"))
+    yield run.parquet_benchmarks(db, directory)
+    db._close_connection()
+
+
+@pytest.fixture(scope="module")
+def reports(synthetic_db):
+    # the reports connect to the db file themselves: a copy of their own, opened by no LostmaDB
+    db_path, schema_dir, log_path = synthetic_db
+    former = (run.reports.VALIDATION_LOG, run.reports.duck_db_path, run.reports.schema_path)
+    run.reports.VALIDATION_LOG = log_path
+    run.reports.duck_db_path = shutil.copyfile(db_path, db_path.with_name("reports.db"))
+    run.reports.schema_path = schema_dir
+    yield run.report_benchmarks()
+    (run.reports.VALIDATION_LOG, run.reports.duck_db_path, run.reports.schema_path) = former
+
+
+def measure(benchmark, function) -> None:
+    benchmark.pedantic(function, rounds=ROUNDS, iterations=1)
+
+
+@pytest.mark.parametrize("name", list(run.db_benchmarks(IDLE)))
+def test_db(benchmark, main_db, name):
+    benchmark.group = "db"
+    measure(benchmark, run.db_benchmarks(main_db)[name])
+
+
+@pytest.mark.parametrize("name", list(run.graph_benchmarks(IDLE)))
+def test_graph(benchmark, main_db, name):
+    benchmark.group = "graph"
+    measure(benchmark, run.graph_benchmarks(main_db)[name])
+
+
+@pytest.mark.parametrize("name", list(run.corpus_benchmarks(IDLE)))
+def test_corpus(benchmark, corpus_db, name):
+    benchmark.group = "corpus slices"
+    measure(benchmark, run.corpus_benchmarks(corpus_db)[name])
+
+
+@pytest.mark.parametrize("name", list(run.parquet_benchmarks(IDLE, Path("unused"))))
+def test_parquet(benchmark, parquet_benchmarks, name):
+    benchmark.group = "parquet"
+    measure(benchmark, parquet_benchmarks[name])
+
+
+@pytest.mark.parametrize("name", list(run.report_benchmarks()))
+def test_reports(benchmark, reports, name):
+    benchmark.group = "reports"
+    measure(benchmark, reports[name])
@@ -0,0 +1,69 @@
+import shutil
+
+import duckdb
+import pytest
+
+from lostma_db import LostmaDB
+
+QUERY = "SELECT count(*) AS n FROM Genre;"
+
+
+@pytest.fixture
+def cached_db(synthetic_files, tmp_path):
+    db_path, schema_dir, _ = synthetic_files
+    db = LostmaDB(None, None, duckdb_path=shutil.copyfile(db_path, tmp_path / "lostma.db"))
+    db.schema_dir = schema_dir
+    yield db
+    db._close_connection()
+
+
+def count(db) -> int:
+    return int(db.sql(QUERY).iat[0, 0])
+
+
+def test_cache_hit(cached_db):
+    assert count(cached_db) == count(cached_db)
+    info = cached_db.cache_info()
+    assert (info["hits"], info["misses"], info["entries"]) == (1, 1, 1)
+    # the whitespaces do not change the request
+    cached_db.sql(QUERY.replace(" ", "\n  "))
+    assert cached_db.cache_info()["hits"] == 2
+
+
+def test_cache_miss_after_write(cached_db):
+    before = count(cached_db)
+    generation = cached_db.cache_info()["generation"]
+    cached_db.sql("INSERT INTO Genre (\"H-ID\") VALUES (1);", is_df=False)
+    assert cached_db.cache_info()["generation"] == generation + 1
+    assert count(cached_db) == before + 1
+    assert cached_db.cache_info()["misses"] == 2
+
+
+def test_cache_miss_after_change_of_the_file(cached_db):
+    before = count(cached_db)
+    # another connection writes in the file (ex: the CLI), the cache of LostmaDB is left as it was
+    with cached_db._connections.lock.write():
+        cached_db._connections.close()
+    with duckdb.connect(cached_db.duckdb_path) as con:
+        con.execute("INSERT INTO Genre (\"H-ID\") VALUES (1);")
+    assert cached_db.cache_info()["entries"] == 1
+    assert count(cached_db) == before + 1
+    assert cached_db.cache_info()["hits"] == 0
+
+
+def test_plans_kept_until_the_db_changes(cached_db):
+    query = cached_db._witnesses_query()
+    catalog = cached_db._catalog
+    cached_db.witnesses()
+    cached_db.sql(QUERY)
+    # the reads keep the catalog and the requests generated from it
+    assert cached_db._catalog is catalog
+    assert cached_db._witnesses_query() is query
+    # a new column: the catalog and the requests are built again, at the next request
+    cached_db.sql("ALTER TABLE Witness ADD COLUMN comment_COLUMN VARCHAR;", is_df=False)
+    assert cached_db._catalog is catalog
+    assert "comment_COLUMN" in cached_db._get_columns("Witness")
+    assert cached_db._catalog is not catalog
+    assert "comment_COLUMN" not in query
+    assert "Witness.\"comment_COLUMN\"" in cached_db._witnesses_query()
+    assert "comment_COLUMN" in cached_db.witnesses().columns
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+from lostma_db.connection import ConnectionManager, RWLock
+
+
+def test_rwlock_writer_runs_alone():
+    lock = RWLock()
+    state = {"readers": 0, "max readers": 0, "overlaps": 0}
+    guard = threading.Lock()
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            with lock.read():
+                with guard:
+                    state["readers"] += 1
+                    state["max readers"] = max(state["max readers"], state["readers"])
+                time.sleep(0.001)
+                with guard:
+                    state["readers"] -= 1
+
+    def writer():
+        for _ in range(20):
+            with lock.write():
+                with guard:
+                    state["overlaps"] += state["readers"]
+                time.sleep(0.001)
+                with guard:
+                    state["overlaps"] += state["readers"]
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    # a waiting writer goes before the new readers: it is not delayed forever
+    writer_thread.join(timeout=10)
+    stop.set()
+    for thread in readers:
+        thread.join()
+    assert not writer_thread.is_alive()
+    assert state["overlaps"] == 0
+    assert state["max readers"] > 1
+
+
+def test_rwlock_writer_can_read_and_write_again():
+    lock = RWLock()
+    with lock.write():
+        with lock.read():
+            with lock.write():
+                pass
+
+
+def test_connection_manager_concurrent_reads_and_writes(tmp_path):
+    manager = ConnectionManager(tmp_path / "lostma.db")
+    with manager.write() as cursor:
+        cursor.execute("CREATE TABLE t (batch INTEGER, i INTEGER);")
+    errors, counts = [], []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with manager.read() as cursor:
+                    counts.append(cursor.execute("SELECT count(*) FROM t;").fetchone()[0])
+            except Exception as error:
+                errors.append(error)
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    for batch in range(10):
+        with manager.write() as cursor:
+            cursor.execute("INSERT INTO t SELECT ?, range FROM range(100);", [batch])
+        time.sleep(0.005)
+    stop.set()
+    for thread in readers:
+        thread.join()
+    with manager.lock.write():
+        manager.close()
+    assert errors == []
+    # a read never sees a write halfway
+    assert counts and all(count % 100 == 0 for count in counts)
+    assert max(counts) <= 1000
+
+
+def test_connection_manager_write_while_reading_same_thread(tmp_path):
+    manager = ConnectionManager(tmp_path / "lostma.db")
+    with manager.write() as cursor:
+        cursor.execute("CREATE TABLE t AS SELECT 1 AS a;")
+    with manager.read():
+        with pytest.raises(RuntimeError):
+            with manager.write():
+                pass
+    with manager.lock.write():
+        manager.close()
+
+
+def test_analyse_report_while_lostmadb_is_open(synthetic_db, synthetic_files, monkeypatch):
+    from lostma_db import LostmaDB, analyse
+    monkeypatch.setattr(analyse, "duck_db_path", synthetic_db.duckdb_path)
+    monkeypatch.setattr(analyse, "schema_path", synthetic_files[1])
+    monkeypatch.setattr(analyse, "VALIDATION_LOG", synthetic_files[2])
+    texts = len(synthetic_db.texts())
+    # the reports connect to the file of the open LostmaDB, and write in it
+    assert analyse.count_required_data()["TextTable"]["total records"] == texts
+    assert analyse.count_log()
+    assert synthetic_db.sql("SELECT count(*) FROM validation_log;", is_df=False).fetchone()[0] > 0
+    # another LostmaDB on the same file can write in it too
+    other = LostmaDB(None, None, duckdb_path=synthetic_db.duckdb_path, cache_bytes=0)
+    other.sql("CREATE TABLE other AS SELECT 1 AS a;", is_df=False)
+    other._close_connection()
+    assert synthetic_db.sql("SELECT a FROM other;", is_df=False).fetchall() == [(1,)]
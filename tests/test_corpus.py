@@ -0,0 +1,37 @@
+import pytest
+
+from synthetic import LANGUAGES
+
+from lostma_db.lostma_tables import LOSTMA_TABLES
+
+CORPUS_NAMES = [name for name in LOSTMA_TABLES if LOSTMA_TABLES[name].get("is_corpus_data")]
+
+
+def rows(table) -> list[str]:
+    # the order of the rows is not part of the result
+    return sorted(map(repr, table.to_pylist()))
+
+
+def results(db, languages: list[str]) -> dict:
+    res = {"texts": rows(db.texts(languages, result_format="arrow")),
+           "witnesses": rows(db.witnesses(languages, result_format="arrow")),
+           "tradition": rows(db.tradition(languages, result_format="arrow"))}
+    if len(languages) == 1:
+        for name in CORPUS_NAMES:
+            analysed = db.analyse(name, languages[0], result_format="arrow")
+            if isinstance(analysed, dict):
+                analysed["completeness table"] = analysed["completeness table"].to_pylist()
+            res[name] = analysed
+    return res
+
+
+@pytest.mark.parametrize("languages", [LANGUAGES[:1], LANGUAGES[2:3], LANGUAGES[1:4]])
+def test_corpus_slices_give_the_same_results(synthetic_db, languages):
+    expected = results(synthetic_db, languages)
+    synthetic_db.build_corpus_tables()
+    # the requests read the slices
+    assert synthetic_db._corpus_sources(["TextTable", "Witness"], languages)
+    assert results(synthetic_db, languages) == expected
+    synthetic_db.drop_corpus_tables()
+    assert not synthetic_db._corpus_sources(["TextTable"], languages)
+    assert results(synthetic_db, languages) == expected
@@ -0,0 +1,38 @@
+from collections import defaultdict
+
+from lostma_db.lostma_tables import TRADITION_CLOSURE_TABLE
+
+
+def descendant_kinds(graph, kind: str) -> list[str]:
+    """Kinds reached from a kind along the relations, in their direction (ex: text -> witness -> part)"""
+    kinds, queue = [], [kind]
+    while queue:
+        source = queue.pop()
+        for (a, b) in graph._forward:
+            if a == source and b not in kinds:
+                kinds.append(b)
+                queue.append(b)
+    return kinds
+
+
+def test_closure_matches_graph_reach(synthetic_db):
+    synthetic_db.build_tradition_closure()
+    graph = synthetic_db.tradition_graph()
+    closure = defaultdict(set)
+    depths = {}
+    for (ancestor_kind, ancestor_id, descendant_kind, descendant_id, depth) in synthetic_db.sql(
+            f"SELECT * FROM {TRADITION_CLOSURE_TABLE};", is_df=False).fetchall():
+        closure[(ancestor_kind, ancestor_id, descendant_kind)].add(descendant_id)
+        depths.setdefault((ancestor_kind, descendant_kind), set()).add(depth)
+    expected = {}
+    for kind in graph.nodes:
+        for target in descendant_kinds(graph, kind):
+            for ancestor_id in graph.nodes[kind].tolist():
+                reached = set(graph.reach(kind, [ancestor_id], target).tolist())
+                if reached:
+                    expected[(kind, ancestor_id, target)] = reached
+    assert len(expected) > len(graph.nodes["text"])
+    assert dict(closure) == expected
+    # the depth is the number of relations on the path of reach
+    assert depths == {(kind, target): {len(graph._path(kind, target)) - 1}
+                      for (kind, _, target) in expected}
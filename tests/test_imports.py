@@ -0,0 +1,14 @@
+import pytest
+
+import import_time
+
+"""
+The import-time guard of benchmarks/import_time.py: no heavy module (duckdb, pandas...) is loaded at import
+    The time itself is left to the benchmark, it depends on the machine
+"""
+
+
+@pytest.mark.parametrize("name", list(import_time.IMPORTS))
+def test_import_loads_no_heavy_module(name):
+    (_, loaded) = import_time.measure(import_time.IMPORTS[name], runs=1)
+    assert loaded == set()
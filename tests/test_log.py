@@ -0,0 +1,98 @@
+import duckdb
+import pytest
+
+from lostma_db import analyse
+from lostma_db.lostma_tables import LOG_TABLE
+
+BLOCK = ("2025-01-01 10:00:{second:02d} - WARNING - invalid record\n"
+         "\t[rty_ID: {rec_type}]\n"
+         "\t[rec_ID: {rec_id}]\n"
+         "\tRule: required field\n"
+         "\tProblem: missing value\n")
+
+
+def block(rec_type: int, rec_id: int) -> str:
+    return BLOCK.format(second=rec_id % 60, rec_type=rec_type, rec_id=rec_id)
+
+
+def logged(con) -> list[tuple]:
+    return con.execute(f"SELECT recType, recID FROM {LOG_TABLE} ORDER BY ALL;").fetchall()
+
+
+@pytest.fixture
+def con():
+    with duckdb.connect() as con:
+        yield con
+
+
+def test_log_table_matches_log_data(con, synthetic_files, monkeypatch):
+    (_, _, log_path) = synthetic_files
+    monkeypatch.setattr(analyse, "VALIDATION_LOG", log_path)
+    count = analyse.load_log(con, log_path)
+    assert count == log_path.read_text().count("\n") // 5
+    rows = con.execute(f"SELECT recType, list(DISTINCT recID ORDER BY recID) FROM {LOG_TABLE} "
+                       "GROUP BY recType;").fetchall()
+    assert dict(rows) == analyse.log_data()
+
+
+def test_follow_log_reads_appended_blocks(con, tmp_path):
+    log_path = tmp_path / "validation.log"
+    log_path.write_text(block(101, 1) + block(102, 2))
+    assert analyse.follow_log(con, log_path) == 2
+    assert analyse.follow_log(con, log_path) == 0
+    with open(log_path, "a") as f:
+        f.write(block(103, 3))
+    assert analyse.follow_log(con, log_path) == 1
+    assert logged(con) == [(101, 1), (102, 2), (103, 3)]
+
+
+def test_follow_log_after_rotation(con, tmp_path):
+    log_path = tmp_path / "validation.log"
+    log_path.write_text(block(101, 1) + block(102, 2))
+    analyse.follow_log(con, log_path)
+    rotated = tmp_path / "validation.log.new"
+    rotated.write_text(block(101, 1) + block(102, 2) + block(104, 4))
+    rotated.replace(log_path)
+    # a new file is read from its beginning: the former blocks are not kept twice
+    assert analyse.follow_log(con, log_path) == 3
+    assert logged(con) == [(101, 1), (102, 2), (104, 4)]
+
+
+def test_follow_log_after_truncation(con, tmp_path):
+    log_path = tmp_path / "validation.log"
+    log_path.write_text(block(101, 1) + block(102, 2))
+    analyse.follow_log(con, log_path)
+    with open(log_path, "w") as f:
+        f.write(block(105, 5))
+    assert analyse.follow_log(con, log_path) == 1
+    assert logged(con) == [(105, 5)]
+
+
+def test_follow_log_last_line_without_newline(con, tmp_path):
+    log_path = tmp_path / "validation.log"
+    log_path.write_text(block(101, 1) + block(102, 2).rstrip("\n"))
+    # the last line may still be written: it waits
+    assert analyse.follow_log(con, log_path) == 1
+    # the file did not change since the last call: the line is complete
+    assert analyse.follow_log(con, log_path) == 1
+    assert analyse.follow_log(con, log_path) == 0
+    with open(log_path, "a") as f:
+        f.write("\n" + block(103, 3))
+    assert analyse.follow_log(con, log_path) == 1
+    assert logged(con) == [(101, 1), (102, 2), (103, 3)]
+
+
+def test_follow_log_final(con, tmp_path):
+    log_path = tmp_path / "validation.log"
+    log_path.write_text(block(101, 1) + block(102, 2).rstrip("\n"))
+    assert analyse.follow_log(con, log_path, final=True) == 2
+    assert analyse.follow_log(con, log_path, final=True) == 0
+
+
+def test_follow_log_former_state(con, tmp_path):
+    log_path = tmp_path / "validation.log"
+    log_path.write_text(block(101, 1))
+    # the state table of a former version, without size and mtime
+    con.execute("CREATE TABLE validation_log_state (inode BIGINT, \"offset\" BIGINT, head BLOB);")
+    assert analyse.follow_log(con, log_path) == 1
+    assert analyse.follow_log(con, log_path) == 0
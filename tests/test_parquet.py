@@ -0,0 +1,43 @@
+import pytest
+
+from synthetic import LANGUAGES
+
+from lostma_db import LostmaDB
+
+QUERY = "SELECT count(*) AS n FROM Genre;"
+
+
+@pytest.fixture
+def exported(synthetic_db, tmp_path):
+    directory = synthetic_db.export_parquet(tmp_path / "parquet")
+    reader = LostmaDB(None, None, parquet_dir=directory)
+    reader.schema_dir = synthetic_db.schema_dir
+    yield synthetic_db, reader
+    reader._close_connection()
+
+
+def count(db) -> int:
+    return int(db.sql(QUERY).iat[0, 0])
+
+
+def test_parquet_reads_the_tables(exported):
+    (db, reader) = exported
+    assert count(reader) == count(db)
+    assert len(reader.texts(LANGUAGES[:1])) == len(db.texts(LANGUAGES[:1]))
+
+
+def test_parquet_cache_after_new_export(exported):
+    (db, reader) = exported
+    before = count(reader)
+    assert count(reader) == before
+    assert reader.cache_info()["hits"] == 1
+    texts = len(reader.texts(LANGUAGES[:1]))
+    # another export writes the files again, under the reader
+    db.sql("DELETE FROM Genre WHERE \"H-ID\" IN (SELECT \"H-ID\" FROM Genre LIMIT 3);", is_df=False)
+    db.sql("DELETE FROM TextTable WHERE \"H-ID\" IN "
+           "(SELECT \"H-ID\" FROM TextTable WHERE language_COLUMN = ? LIMIT 2);", [LANGUAGES[0]], is_df=False)
+    db.build_scope_index()
+    db.export_parquet(reader.parquet_dir)
+    assert count(reader) == before - 3
+    assert len(reader.texts(LANGUAGES[:1])) == texts - 2
+    assert reader.cache_info()["hits"] == 1
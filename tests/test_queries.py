@@ -0,0 +1,33 @@
+import pytest
+
+from synthetic import LANGUAGES
+from witnesses_join import LIST_CONTAINS_JOINS
+
+from lostma_db.client import interval
+
+
+@pytest.mark.parametrize("table", ["TextTable", "Witness", "DocumentTable"])
+@pytest.mark.parametrize("years", [(1100, 1200), (1250, 1251), (1000, 1099), (1480, 1600)])
+def test_dated_matches_interval(synthetic_db, table, years):
+    expected = interval(synthetic_db.table(table), "date_of_creation", *years)
+    res = synthetic_db.dated(table, "date_of_creation", *years)
+    assert sorted(res["H-ID"]) == sorted(expected["H-ID"])
+
+
+def different_rows(db, query: str, former: str) -> tuple[int, int, int]:
+    return db.sql(f"SELECT (SELECT count(*) FROM ({query})), "
+                  f"(SELECT count(*) FROM (({query}) EXCEPT ALL ({former}))), "
+                  f"(SELECT count(*) FROM (({former}) EXCEPT ALL ({query})));", is_df=False).fetchone()
+
+
+@pytest.mark.parametrize("sliced", [False, True])
+@pytest.mark.parametrize("languages", [None, LANGUAGES[:1], LANGUAGES[1:3]])
+def test_witnesses_match_former_join(synthetic_db, sliced, languages):
+    if sliced:
+        synthetic_db.build_corpus_tables()
+    # the join of Part on list_contains, before the witness -> part edges
+    condition = f"WHERE TextTable.language_COLUMN IN ('{"', '".join(languages)}')" if languages else ""
+    former = synthetic_db._table_query("Witness", condition, LIST_CONTAINS_JOINS)
+    (rows, only_new, only_former) = different_rows(synthetic_db, synthetic_db._witnesses_query(languages), former)
+    assert rows and (only_new, only_former) == (0, 0)
+    assert len(synthetic_db.witnesses(languages)) == rows
@@ -0,0 +1,74 @@
+import json
+import shutil
+
+import duckdb
+import pytest
+
+from lostma_db import analyse, report
+from lostma_db.lostma_tables import LOG_TABLE
+
+
+@pytest.fixture
+def report_files(synthetic_files, tmp_path, monkeypatch):
+    # the reports of analyse.py open the db file themselves: a copy of their own
+    db_path, schema_dir, log_path = synthetic_files
+    db_path = shutil.copyfile(db_path, tmp_path / "lostma.db")
+    monkeypatch.setattr(analyse, "duck_db_path", db_path)
+    monkeypatch.setattr(analyse, "schema_path", schema_dir)
+    monkeypatch.setattr(analyse, "VALIDATION_LOG", log_path)
+    return db_path, schema_dir, log_path
+
+
+def enum_mistakes(db_path, schema_dir, sample_size: int) -> dict:
+    # the values out of the vocabulary of each enum field, checked in python one record at a time
+    collect = {}
+    with duckdb.connect(db_path) as con:
+        tables = {t[0] for t in con.sql("SHOW TABLES;").fetchall()}
+        for (table, enums) in analyse.def_enum(schema_dir).items():
+            if table not in tables:
+                continue
+            columns = [c[0] for c in con.sql(f'DESCRIBE "{table}";').fetchall()]
+            records = con.sql(f'SELECT * FROM "{table}";').fetchall()
+            for (enum, terms) in enums.items():
+                if enum not in columns:
+                    continue
+                i = columns.index(enum)
+                mistakes, values = 0, set()
+                for record in records:
+                    value = record[i]
+                    wrong = {str(v) for v in (value if isinstance(value, list) else [value])
+                             if v is not None and str(v) not in terms}
+                    mistakes += bool(wrong)
+                    values |= wrong
+                if mistakes:
+                    collect.setdefault(table, {})[enum] = {
+                        'empty records': mistakes,
+                        'total records': len(records),
+                        'percentage problem': round((mistakes / len(records)) * 100, 2),
+                        'sample values': sorted(values)[:sample_size]}
+    return collect
+
+
+def test_validation_enum_matches_python_check(report_files):
+    db_path, schema_dir, _ = report_files
+    result = analyse.validation_enum(sample_size=2)
+    assert result
+    assert result == enum_mistakes(db_path, schema_dir, 2)
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_run_reports_leaves_the_reports_of_analyse(report_files, tmp_path, processes):
+    db_path, schema_dir, log_path = report_files
+    source = shutil.copyfile(db_path, tmp_path / "source.db")
+    former = (analyse.duck_db_path, analyse.schema_path, analyse.VALIDATION_LOG)
+    assert report.run_reports(source, schema_dir, log_path, report.REPORT_KINDS, tables=["genre"],
+                              workers=2, processes=processes, file_format="json", out=tmp_path / "out") == 0
+    assert (analyse.duck_db_path, analyse.schema_path, analyse.VALIDATION_LOG) == former
+    assert report._WORKER == {}
+    results = {kind: json.loads((tmp_path / "out" / f"{kind}.json").read_text()) for kind in report.REPORT_KINDS}
+    assert results["validation_enum"] == report.to_records(analyse.validation_enum())
+    assert results["count_required_data"] == report.to_records(analyse.count_required_data())
+    # the reports of analyse.py still run on their own db, which the report run did not write
+    with duckdb.connect(source) as con:
+        assert not con.sql(f"SELECT * FROM duckdb_tables() WHERE table_name = '{LOG_TABLE}';").fetchall()
+    assert report.to_records(analyse.count_log()) == results["count_log"]
@@ -0,0 +1,37 @@
+import pyarrow as pa
+import pytest
+
+from lostma_db.results import RESULT_FORMATS, from_records
+
+
+def test_reader_interleaved_with_other_requests(synthetic_db):
+    witnesses = synthetic_db.sql("SELECT * FROM Witness ORDER BY \"H-ID\";", result_format="reader")
+    texts = synthetic_db.sql("SELECT * FROM TextTable;", result_format="reader")
+    # other requests on the same thread, before the readers are read
+    assert len(synthetic_db.sql("SELECT * FROM Part;")) == 400
+    synthetic_db.sql("CREATE TABLE other AS SELECT 1 AS a;", is_df=False)
+    assert texts.read_all().num_rows == 200
+    table = witnesses.read_all()
+    assert table.num_rows == 600
+    assert table.column("H-ID").to_pylist() == sorted(table.column("H-ID").to_pylist())
+
+
+@pytest.mark.parametrize("result_format", RESULT_FORMATS)
+def test_result_formats_give_the_same_rows(synthetic_db, result_format):
+    query = "SELECT \"H-ID\", language_COLUMN FROM TextTable ORDER BY \"H-ID\";"
+    expected = synthetic_db.sql(query, result_format="arrow")
+    res = synthetic_db.sql(query, result_format=result_format)
+    if result_format == "reader":
+        res = res.read_all()
+    elif result_format == "pandas":
+        res = pa.Table.from_pandas(res, preserve_index=False)
+    elif result_format == "polars":
+        res = res.to_arrow()
+    assert res.to_pylist() == expected.to_pylist()
+
+
+def test_from_records_mixed_types():
+    records = [{"field": "a", "action required": 3}, {"field": "b", "action required": "No field for this table"}]
+    table = from_records(records, "arrow")
+    assert table.column("action required").to_pylist() == ["3", "No field for this table"]
+    assert from_records(records, "pandas").to_dict("records") == records
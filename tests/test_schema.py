@@ -0,0 +1,38 @@
+import shutil
+
+import pytest
+
+from lostma_db import general
+
+
+@pytest.fixture
+def schema_dir(synthetic_files, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # the compiled schemas of the process are forgotten
+    monkeypatch.setattr(general, "_COMPILED", {})
+    return shutil.copytree(synthetic_files[1], tmp_path / "jbcamps_gestes_schema")
+
+
+def test_schema_cache_out_of_the_working_directory(schema_dir, tmp_path, cache_home):
+    model = general.compile_schema(schema_dir)
+    cache = general.schema_cache(schema_dir.resolve())
+    assert cache.is_file() and cache.is_relative_to(cache_home)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["jbcamps_gestes_schema"]
+    assert all(p.suffix == ".csv" for p in schema_dir.iterdir())
+    general._COMPILED.clear()
+    assert general.compile_schema(schema_dir) == model
+
+
+def test_schema_cache_follows_the_csv_files(schema_dir):
+    assert "title" in general.compile_schema(schema_dir)["Stemma"]
+    general._COMPILED.clear()
+    text = (schema_dir / "Stemma.csv").read_text()
+    (schema_dir / "Stemma.csv").write_text(text.replace("title,title", "heading,heading"))
+    assert list(general.compile_schema(schema_dir)["Stemma"]) == ["heading"]
+
+
+def test_unreadable_schema_cache_is_built_again(schema_dir):
+    model = general.compile_schema(schema_dir)
+    general._COMPILED.clear()
+    general.schema_cache(schema_dir.resolve()).write_bytes(b"truncated")
+    assert general.compile_schema(schema_dir) == model
@@ -0,0 +1,132 @@
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+SCHEMA_DIR = Path("jbcamps_gestes_schema")
+EXPECTED = {"TextTable": [(1, "text 1", "fro (Old French)", []), (2, "text 2", "lat (Latin)", [])],
+            "Witness": [(10, 1, [], "witness 10")],
+            "Book": [(100, "book 100")]}
+
+
+def tables(db) -> dict:
+    return {table: db.sql(f'SELECT * FROM "{table}" ORDER BY ALL', is_df=False).fetchall()
+            for table in ["TextTable", "Witness", "Book"] if db._has_table(table)}
+
+
+def staging_files(tmp_path) -> list[Path]:
+    return sorted(tmp_path.glob("lostma.staging-*")) + sorted(tmp_path.glob("*.staging"))
+
+
+def test_sync_downloads_db_and_schema(db, fake_cli):
+    db.sync()
+    assert tables(db) == EXPECTED
+    assert sorted(f.name for f in SCHEMA_DIR.iterdir()) == ["Book.csv", "TextTable.csv", "Witness.csv"]
+
+
+def test_incremental_sync_replaces_changed_tables(db, fake_cli, capsys):
+    db.sync()
+    fake_cli.spec["tables"]["Witness"]["rows"].append([11, 2, [], "witness 11"])
+    fake_cli.save()
+    capsys.readouterr()
+    db.sync(incremental=True)
+    assert "Tables updated: Witness" in capsys.readouterr().out
+    assert tables(db)["Witness"] == [(10, 1, [], "witness 10"), (11, 2, [], "witness 11")]
+    assert tables(db)["TextTable"] == EXPECTED["TextTable"]
+
+
+def test_incremental_sync_without_change(db, fake_cli, capsys):
+    db.sync()
+    capsys.readouterr()
+    db.sync(incremental=True)
+    assert "Tables updated: none" in capsys.readouterr().out
+
+
+def test_incremental_sync_renames_changed_schema_files(db, fake_cli):
+    db.sync()
+    before = {f.name: f.stat().st_ino for f in SCHEMA_DIR.iterdir()}
+    fake_cli.spec["schema"]["Witness.csv"]["content"] += "date_of_creation\n"
+    fake_cli.save()
+    db.sync(incremental=True)
+    after = {f.name: f.stat().st_ino for f in SCHEMA_DIR.iterdir()}
+    # a file renamed into place is a new inode, an unchanged file is left as it was
+    assert after["Witness.csv"] != before["Witness.csv"]
+    assert (SCHEMA_DIR / "Witness.csv").read_text().endswith("date_of_creation\n")
+    assert after["TextTable.csv"] == before["TextTable.csv"]
+    assert after["Book.csv"] == before["Book.csv"]
+
+
+def test_sync_merges_several_groups(db, fake_cli, tmp_path):
+    db.sync(["My record types", "Bibliography"])
+    assert tables(db) == EXPECTED
+    # one download for each group, and one download of the schema of both
+    downloads = [call for call in fake_cli.calls() if call.startswith("download")]
+    assert sorted(call.split(" -r ")[1] for call in downloads) == ["Bibliography", "My record types"]
+    assert sorted(f.name for f in SCHEMA_DIR.iterdir()) == ["Book.csv", "TextTable.csv", "Witness.csv"]
+    # the base tables, in every file, are merged once
+    assert db.sql("SELECT count(*) FROM rty", is_df=False).fetchone()[0] == 1
+    assert staging_files(tmp_path) == []
+
+
+def test_failed_download_removes_staging_files(db, fake_cli, tmp_path):
+    db.sync()
+    fake_cli.spec["fail"] = 10
+    fake_cli.spec["tables"]["Witness"]["rows"] = []
+    fake_cli.save()
+    with pytest.raises(subprocess.CalledProcessError):
+        db.sync(["My record types", "Bibliography"], retries=1)
+    assert staging_files(tmp_path) == []
+    # the db is left as it was
+    assert tables(db)["Witness"] == EXPECTED["Witness"]
+
+
+def test_retry_after_failed_download(db, fake_cli, tmp_path, capsys):
+    db.sync()
+    fake_cli.spec["fail"] = 1
+    fake_cli.spec["tables"]["Witness"]["rows"].append([11, 2, [], "witness 11"])
+    fake_cli.save()
+    capsys.readouterr()
+    db.sync(incremental=True, max_workers=1, retries=1)
+    assert "retrying" in capsys.readouterr().out
+    assert tables(db)["Witness"] == [(10, 1, [], "witness 10"), (11, 2, [], "witness 11")]
+    assert staging_files(tmp_path) == []
+
+
+def test_reads_go_on_during_staged_sync(db, fake_cli):
+    db.sync()
+    fake_cli.spec["delay"] = 1
+    fake_cli.save()
+    sync = threading.Thread(target=db.sync, kwargs={"incremental": True})
+    sync.start()
+    time.sleep(0.3)
+    slowest = 0
+    while sync.is_alive():
+        start = time.perf_counter()
+        db.sql("SELECT count(*) FROM Witness", is_df=False).fetchone()
+        slowest = max(slowest, time.perf_counter() - start)
+        time.sleep(0.02)
+    sync.join()
+    # the reads only wait for the swap of the tables, not for the downloads
+    assert slowest < 0.5
+
+
+def test_single_group_retry_after_failed_download(db, fake_cli, tmp_path, capsys):
+    fake_cli.spec["fail"] = 1
+    fake_cli.save()
+    db.sync("My record types", retries=1)
+    assert "retrying" in capsys.readouterr().out
+    assert tables(db) == {"TextTable": EXPECTED["TextTable"], "Witness": EXPECTED["Witness"]}
+    assert staging_files(tmp_path) == []
+
+
+def test_single_group_failed_download_leaves_db(db, fake_cli, tmp_path):
+    db.sync()
+    fake_cli.spec["fail"] = 10
+    fake_cli.spec["tables"]["Witness"]["rows"] = []
+    fake_cli.save()
+    with pytest.raises(subprocess.CalledProcessError):
+        db.sync("My record types", retries=1)
+    assert tables(db) == EXPECTED
+    assert staging_files(tmp_path) == []